@@ -0,0 +1,5 @@
+#!/bin/sh
+# Разрешает потоковую репликацию с других контейнеров (реплика из docker-compose.replica.yml).
+# Образ postgres выполняет скрипт один раз, при инициализации пустого тома.
+set -e
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
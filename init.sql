@@ -143,11 +143,77 @@ ALTER TABLE ONLY votes
 ALTER TABLE ONLY votes
     ADD CONSTRAINT votes_poll_id_user_id_key UNIQUE (poll_id, user_id);
 
+-- Table: vote_counters (per-option vote tallies, sharded to spread hot-poll writes)
+
+CREATE TABLE vote_counters (
+    poll_id bigint NOT NULL,
+    option_id bigint NOT NULL,
+    shard smallint NOT NULL,
+    votes_count bigint DEFAULT 0 NOT NULL
+);
+
+ALTER TABLE vote_counters OWNER TO postgres;
+
+ALTER TABLE ONLY vote_counters
+    ADD CONSTRAINT vote_counters_pkey PRIMARY KEY (option_id, shard);
+
+-- Table: fsm_storage (aiogram FSM state and data, survives restarts and is shared by all instances)
+
+CREATE TABLE fsm_storage (
+    bot_id bigint NOT NULL,
+    chat_id bigint NOT NULL,
+    user_id bigint NOT NULL,
+    thread_id bigint DEFAULT 0 NOT NULL,
+    business_connection_id text DEFAULT ''::text NOT NULL,
+    destiny text DEFAULT 'default'::text NOT NULL,
+    state text,
+    data jsonb DEFAULT '{}'::jsonb NOT NULL,
+    updated_at timestamp without time zone DEFAULT now() NOT NULL
+);
+
+ALTER TABLE fsm_storage OWNER TO postgres;
+
+ALTER TABLE ONLY fsm_storage
+    ADD CONSTRAINT fsm_storage_pkey PRIMARY KEY (bot_id, chat_id, user_id, thread_id, business_connection_id, destiny);
+
+-- Table: live_results (messages with poll results that the bot edits as votes come in)
+
+CREATE TABLE live_results (
+    poll_id bigint NOT NULL,
+    chat_id bigint NOT NULL,
+    message_id bigint NOT NULL,
+    created_at timestamp without time zone DEFAULT now() NOT NULL
+);
+
+ALTER TABLE live_results OWNER TO postgres;
+
+ALTER TABLE ONLY live_results
+    ADD CONSTRAINT live_results_pkey PRIMARY KEY (poll_id);
+
+-- Indexes
+
+CREATE INDEX ix_polls_is_active_end_time ON polls USING btree (is_active, end_time);
+
+CREATE INDEX ix_polls_creator_id ON polls USING btree (creator_id);
+
+CREATE INDEX ix_poll_participants_user_id ON poll_participants USING btree (user_id);
+
+CREATE INDEX ix_votes_option_id ON votes USING btree (option_id);
+
+CREATE INDEX ix_poll_options_poll_id ON poll_options USING btree (poll_id);
+
+CREATE INDEX ix_vote_counters_poll_id ON vote_counters USING btree (poll_id);
+
+CREATE INDEX ix_users_username_key ON users USING btree (lower((COALESCE(username, ''::character varying))::text) COLLATE "C", telegram_id);
+
 -- Foreign keys
 
 ALTER TABLE ONLY poll_options
     ADD CONSTRAINT poll_options_poll_id_fkey FOREIGN KEY (poll_id) REFERENCES polls(id) ON DELETE CASCADE;
 
+ALTER TABLE ONLY live_results
+    ADD CONSTRAINT live_results_poll_id_fkey FOREIGN KEY (poll_id) REFERENCES polls(id) ON DELETE CASCADE;
+
 ALTER TABLE ONLY poll_participants
     ADD CONSTRAINT poll_participants_poll_id_fkey FOREIGN KEY (poll_id) REFERENCES polls(id);
 
@@ -164,4 +230,10 @@ ALTER TABLE ONLY votes
     ADD CONSTRAINT votes_poll_id_fkey FOREIGN KEY (poll_id) REFERENCES polls(id) ON DELETE CASCADE;
 
 ALTER TABLE ONLY votes
-    ADD CONSTRAINT votes_user_id_fkey FOREIGN KEY (user_id) REFERENCES users(telegram_id) ON DELETE CASCADE;
\ No newline at end of file
+    ADD CONSTRAINT votes_user_id_fkey FOREIGN KEY (user_id) REFERENCES users(telegram_id) ON DELETE CASCADE;
+
+ALTER TABLE ONLY vote_counters
+    ADD CONSTRAINT vote_counters_option_id_fkey FOREIGN KEY (option_id) REFERENCES poll_options(id) ON DELETE CASCADE;
+
+ALTER TABLE ONLY vote_counters
+    ADD CONSTRAINT vote_counters_poll_id_fkey FOREIGN KEY (poll_id) REFERENCES polls(id) ON DELETE CASCADE;
\ No newline at end of file
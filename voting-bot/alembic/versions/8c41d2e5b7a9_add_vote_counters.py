@@ -0,0 +1,45 @@
+"""Add vote counters
+
+Revision ID: 8c41d2e5b7a9
+Revises: 3a27f121c102
+Create Date: 2026-10-18 12:05:13.482915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c41d2e5b7a9'
+down_revision: Union[str, None] = '3a27f121c102'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade():
+    # Create vote_counters table (per-option tallies, sharded by user)
+    op.create_table(
+        'vote_counters',
+        sa.Column('poll_id', sa.BigInteger, nullable=False),
+        sa.Column('option_id', sa.BigInteger, nullable=False),
+        sa.Column('shard', sa.SmallInteger, nullable=False),
+        sa.Column('votes_count', sa.BigInteger, nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('option_id', 'shard'),
+        sa.ForeignKeyConstraint(['poll_id'], ['polls.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['option_id'], ['poll_options.id'], ondelete='CASCADE')
+    )
+
+    # Backfill counters from the votes already cast
+    op.execute(
+        """
+        INSERT INTO vote_counters (poll_id, option_id, shard, votes_count)
+        SELECT poll_id, option_id, 0, COUNT(*)
+        FROM votes
+        GROUP BY poll_id, option_id
+        """
+    )
+
+
+def downgrade():
+    op.drop_table('vote_counters')
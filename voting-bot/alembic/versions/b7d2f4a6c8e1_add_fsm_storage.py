@@ -0,0 +1,39 @@
+"""Add fsm storage
+
+Revision ID: b7d2f4a6c8e1
+Revises: e5f0a3c1d9b4
+Create Date: 2026-10-18 18:21:40.117204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2f4a6c8e1'
+down_revision: Union[str, None] = 'e5f0a3c1d9b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade():
+    # Create fsm_storage table (aiogram FSM state shared by all bot instances)
+    op.create_table(
+        'fsm_storage',
+        sa.Column('bot_id', sa.BigInteger, nullable=False),
+        sa.Column('chat_id', sa.BigInteger, nullable=False),
+        sa.Column('user_id', sa.BigInteger, nullable=False),
+        sa.Column('thread_id', sa.BigInteger, nullable=False, server_default='0'),
+        sa.Column('business_connection_id', sa.Text, nullable=False, server_default=''),
+        sa.Column('destiny', sa.Text, nullable=False, server_default='default'),
+        sa.Column('state', sa.Text),
+        sa.Column('data', postgresql.JSONB, nullable=False, server_default='{}'),
+        sa.Column('updated_at', sa.DateTime, nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('bot_id', 'chat_id', 'user_id', 'thread_id', 'business_connection_id', 'destiny')
+    )
+
+
+def downgrade():
+    op.drop_table('fsm_storage')
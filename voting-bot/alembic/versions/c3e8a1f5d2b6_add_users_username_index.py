@@ -0,0 +1,30 @@
+"""Add users username index
+
+Revision ID: c3e8a1f5d2b6
+Revises: b7d2f4a6c8e1
+Create Date: 2026-10-18 19:02:11.540318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e8a1f5d2b6'
+down_revision: Union[str, None] = 'b7d2f4a6c8e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade():
+    # Keyset pagination and username prefix search in the user picker
+    op.execute(
+        """
+        CREATE INDEX ix_users_username_key ON users
+        USING btree (lower(COALESCE(username, '')) COLLATE "C", telegram_id)
+        """
+    )
+
+
+def downgrade():
+    op.drop_index('ix_users_username_key', table_name='users')
@@ -0,0 +1,32 @@
+"""Add live results
+
+Revision ID: d9a4c7e2b1f3
+Revises: c3e8a1f5d2b6
+Create Date: 2026-10-18 19:47:25.803164
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9a4c7e2b1f3'
+down_revision: Union[str, None] = 'c3e8a1f5d2b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade():
+    # Messages with poll results that the bot edits as votes come in
+    op.create_table(
+        'live_results',
+        sa.Column('poll_id', sa.BigInteger, sa.ForeignKey('polls.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('chat_id', sa.BigInteger, nullable=False),
+        sa.Column('message_id', sa.BigInteger, nullable=False),
+        sa.Column('created_at', sa.DateTime, nullable=False, server_default=sa.func.now())
+    )
+
+
+def downgrade():
+    op.drop_table('live_results')
@@ -0,0 +1,69 @@
+"""Reconcile schema with init.sql and add indexes
+
+Revision ID: e5f0a3c1d9b4
+Revises: 8c41d2e5b7a9
+Create Date: 2026-10-18 16:48:02.913477
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5f0a3c1d9b4'
+down_revision: Union[str, None] = '8c41d2e5b7a9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade():
+    # Columns that init.sql and bothandler rely on
+    op.add_column('polls', sa.Column('is_private', sa.Boolean, server_default='FALSE'))
+    op.add_column('polls', sa.Column('allow_custom', sa.Boolean, server_default='FALSE'))
+    op.add_column('polls', sa.Column('vote_type', sa.String(20)))
+    op.add_column('polls', sa.Column('data_type', sa.String(20)))
+    op.add_column('poll_options', sa.Column('is_custom', sa.Boolean, server_default='FALSE'))
+
+    # Create poll_settings table
+    op.create_table(
+        'poll_settings',
+        sa.Column('poll_id', sa.BigInteger, primary_key=True),
+        sa.Column('allow_custom', sa.Boolean, server_default='FALSE'),
+        sa.ForeignKeyConstraint(['poll_id'], ['polls.id'])
+    )
+
+    # Create poll_participants table
+    op.create_table(
+        'poll_participants',
+        sa.Column('poll_id', sa.BigInteger, nullable=False),
+        sa.Column('user_id', sa.BigInteger, nullable=False),
+        sa.PrimaryKeyConstraint('poll_id', 'user_id'),
+        sa.ForeignKeyConstraint(['poll_id'], ['polls.id'])
+    )
+
+    # Indexes for the access paths used by the bot
+    op.create_index('ix_polls_is_active_end_time', 'polls', ['is_active', 'end_time'])
+    op.create_index('ix_polls_creator_id', 'polls', ['creator_id'])
+    op.create_index('ix_poll_participants_user_id', 'poll_participants', ['user_id'])
+    op.create_index('ix_votes_option_id', 'votes', ['option_id'])
+    op.create_index('ix_poll_options_poll_id', 'poll_options', ['poll_id'])
+    op.create_index('ix_vote_counters_poll_id', 'vote_counters', ['poll_id'])
+
+
+def downgrade():
+    op.drop_index('ix_vote_counters_poll_id', table_name='vote_counters')
+    op.drop_index('ix_poll_options_poll_id', table_name='poll_options')
+    op.drop_index('ix_votes_option_id', table_name='votes')
+    op.drop_index('ix_poll_participants_user_id', table_name='poll_participants')
+    op.drop_index('ix_polls_creator_id', table_name='polls')
+    op.drop_index('ix_polls_is_active_end_time', table_name='polls')
+
+    op.drop_table('poll_participants')
+    op.drop_table('poll_settings')
+
+    op.drop_column('poll_options', 'is_custom')
+    op.drop_column('polls', 'data_type')
+    op.drop_column('polls', 'vote_type')
+    op.drop_column('polls', 'allow_custom')
+    op.drop_column('polls', 'is_private')
@@ -5,8 +5,23 @@ from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram import BaseMiddleware
-from keyboard import keyboard
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from keyboard import keyboard, StatsPage, UserPage, UserPick, VotePoll, VotePollPage, Vote
 from logger import logger
+from cache import lrucache
+from votebuffer import votebuffer
+from scheduler import expiryscheduler
+from liveresults import liveresults
+from invalidation import invalidationbus
+from pgstorage import PostgresStorage, PostgresStorageMiddleware
+import metrics
+from throttling import ThrottlingMiddleware
+import webhook
+from repository import repository
+from replica import replica
+from models import Poll, PollSummary, PollOption, User
+from sendqueue import sendqueue, SendQueueMiddleware, split_text, bulk
 from datetime import datetime, timedelta
 import config
 import asyncpg
@@ -14,6 +29,12 @@ import sys
 
 
 class UserMiddleware(BaseMiddleware):
+    _UNKNOWN = object()
+
+    def __init__(self, known_users: lrucache, upsert_user):
+        self.known_users = known_users  # telegram_id -> username, уже сохранённый в БД
+        self.upsert_user = upsert_user  # async (telegram_id, username) -> True, если пользователь новый
+
     async def __call__(self, handler, event, data):
         if isinstance(event, types.Message):
             user_id = event.from_user.id
@@ -21,6 +42,13 @@ class UserMiddleware(BaseMiddleware):
         elif isinstance(event, types.CallbackQuery):
             user_id = event.from_user.id
             data['user_id'] = user_id
+
+        # В БД пишем только новых пользователей и сменившиеся username
+        data['is_new_user'] = False
+        user = event.from_user
+        if user and self.known_users.get(user.id, self._UNKNOWN) != user.username:
+            data['is_new_user'] = await self.upsert_user(user.id, user.username)
+            self.known_users.set(user.id, user.username)
         return await handler(event, data)
 
 
@@ -33,16 +61,15 @@ class bothandler:
         waiting_for_duration = State()
         waiting_for_participants = State()  # Новый шаг для ввода участников
 
-    class Voting(StatesGroup):
-        choosing_poll = State()
-        choosing_option = State()
-
     class PollManagement(StatesGroup):
         choosing_poll = State()
         confirm_action = State()
         choosing_participant_poll = State()  # Выбор голосования для добавления участников
         adding_participants = State()  # Добавление участников
 
+    class UserDirectory(StatesGroup):
+        browsing = State()  # Просмотр списка пользователей, текст сообщения — поиск по username
+
     def __init__(self):
         self.BOT_TOKEN = os.getenv("BOT_TOKEN")
         self.DB_USER = os.getenv("DB_USER")
@@ -56,12 +83,49 @@ class bothandler:
             sys.exit(1)
 
         self.bot = Bot(token=self.BOT_TOKEN)
-        self.dp = Dispatcher()
+        self.fsm_storage = None
+        if config.сonfig.FSM_STORAGE == "postgres":
+            self.fsm_storage = PostgresStorage(
+                cache_size=config.сonfig.FSM_CACHE_SIZE,
+                cache_ttl=config.сonfig.FSM_CACHE_TTL
+            )
+            self.dp = Dispatcher(storage=self.fsm_storage, disable_fsm=True)
+        else:
+            self.dp = Dispatcher(disable_fsm=True)  # FSM подключается в _register_handlers после ограничения частоты
+        self.known_users = lrucache(config.сonfig.KNOWN_USERS_CACHE_SIZE, config.сonfig.KNOWN_USERS_CACHE_TTL)
         self._register_handlers()
-        self.active_polls = {}
-        self.archived_polls = {}
+
+        # Кэш горячего пути голосования: строки голосований и их варианты
+        cache_size = config.сonfig.POLL_CACHE_SIZE
+        cache_ttl = config.сonfig.POLL_CACHE_TTL
+        self.poll_cache = lrucache(cache_size, cache_ttl)
+        self.options_cache = lrucache(cache_size, cache_ttl)
 
         self.pool = None
+        self.replica = None  # Реплика для чтения (если задана)
+        self.db = None  # Репозиторий запросов поверх пула
+        self.metrics_port = config.сonfig.METRICS_PORT  # Воркеры shardrunner сдвигают порт на свой номер
+        self.metrics_runner = None
+        self.send_queue = None  # Очередь исходящих сообщений (если включена)
+        self.vote_buffer = None  # Буфер отложенной записи голосов (если включён)
+        self.expiry_scheduler = expiryscheduler(self.close_expired_polls)
+        self.invalidation_bus = None
+        if config.сonfig.INVALIDATION_ENABLED:
+            self.invalidation_bus = invalidationbus(
+                config.сonfig.INVALIDATION_CHANNEL,
+                self.apply_poll_event,
+                on_reconnect=self.reset_local_state
+            )
+        shared = self.invalidation_bus is not None  # Живое сообщение правит только экземпляр-владелец
+        self.live_results = liveresults(
+            self.fetch_poll_stats,
+            self.format_poll_stats,
+            self.edit_live_results,
+            interval=config.сonfig.LIVE_RESULTS_INTERVAL,
+            claim_func=self.claim_live_results if shared else None,
+            release_func=self.release_live_results if shared else None,
+            delegate_func=self.delegate_live_results if shared else None
+        )
 
     async def init_db(self):
         """Инициализирует пул соединений с PostgreSQL."""
@@ -71,18 +135,82 @@ class bothandler:
                 password=self.DB_PASSWORD,
                 database=self.DB_NAME,
                 host=self.DB_HOST,
-                port=self.DB_PORT)
+                port=self.DB_PORT,
+                min_size=config.сonfig.DB_POOL_MIN_SIZE,
+                max_size=config.сonfig.DB_POOL_MAX_SIZE,
+                statement_cache_size=config.сonfig.DB_STATEMENT_CACHE_SIZE,
+                max_inactive_connection_lifetime=config.сonfig.DB_MAX_INACTIVE_CONNECTION_LIFETIME,
+                init=metrics.setup_connection if config.сonfig.METRICS_ENABLED else None)
+            if config.сonfig.METRICS_ENABLED:
+                self.pool = metrics.instrumentedpool(self.pool)
+            if config.сonfig.DB_REPLICA_HOST:
+                await self.init_replica()
+            self.db = repository(
+                self.pool,
+                acquire_timeout=config.сonfig.DB_ACQUIRE_TIMEOUT,
+                replica=self.replica
+            )
+            if self.fsm_storage:
+                self.fsm_storage.pool = self.pool
             print("Successfully initialized DB")
         except Exception as e:
             print(f"Database initialization failed: {e}")
             sys.exit(1)
 
+    async def init_replica(self):
+        """Создаёт пул реплики для чтения."""
+        pool = await asyncpg.create_pool(
+            user=self.DB_USER,
+            password=self.DB_PASSWORD,
+            database=self.DB_NAME,
+            host=config.сonfig.DB_REPLICA_HOST,
+            port=config.сonfig.DB_REPLICA_PORT,
+            min_size=0,  # Соединения открываются по требованию: недоступная реплика не мешает запуску
+            max_size=config.сonfig.DB_POOL_MAX_SIZE,
+            statement_cache_size=config.сonfig.DB_STATEMENT_CACHE_SIZE,
+            max_inactive_connection_lifetime=config.сonfig.DB_MAX_INACTIVE_CONNECTION_LIFETIME,
+            init=metrics.setup_connection if config.сonfig.METRICS_ENABLED else None)
+        if config.сonfig.METRICS_ENABLED:
+            pool = metrics.instrumentedpool(pool)
+        self.replica = replica(
+            pool,
+            self.pool,
+            max_lag=config.сonfig.DB_REPLICA_MAX_LAG,
+            check_interval=config.сonfig.DB_REPLICA_CHECK_INTERVAL,
+            timeout=config.сonfig.DB_REPLICA_TIMEOUT
+        )
+        await self.replica.check()
+        print(f"Реплика для чтения: {config.сonfig.DB_REPLICA_HOST}:{config.сonfig.DB_REPLICA_PORT}, "
+              f"{'доступна' if self.replica.available else 'пока недоступна, чтение из primary'}")
+
     async def close_db(self):
         """Закрывает пул соединений с PostgreSQL."""
+        if self.replica:
+            await self.replica.pool.close()
         await self.pool.close()
 
     def _register_handlers(self):
-        self.dp.message.middleware.register(UserMiddleware())  # Регистрация middleware
+        if config.сonfig.METRICS_ENABLED:
+            self.dp.update.outer_middleware.register(metrics.UpdateMetricsMiddleware())
+        if config.сonfig.THROTTLE_ENABLED:
+            # Раньше FSM и UserMiddleware: запрос сверх лимита не обращается к БД
+            self.dp.update.outer_middleware.register(ThrottlingMiddleware(
+                config.сonfig.THROTTLE_RATE,
+                config.сonfig.THROTTLE_BURST,
+                limits=config.сonfig.THROTTLE_LIMITS,
+                max_users=config.сonfig.THROTTLE_MAX_USERS,
+                router=self.dp
+            ))
+        self.dp.update.outer_middleware.register(self.dp.fsm)
+        user_middleware = UserMiddleware(self.known_users, self.upsert_user)
+        self.dp.message.middleware.register(user_middleware)  # Регистрация middleware
+        self.dp.callback_query.middleware.register(user_middleware)
+        if config.сonfig.METRICS_ENABLED:
+            self.dp.message.middleware.register(metrics.HandlerMetricsMiddleware())
+            self.dp.callback_query.middleware.register(metrics.HandlerMetricsMiddleware())
+        if self.fsm_storage:
+            # Внешний middleware обновления: состояние сохраняется после всех обработчиков
+            self.dp.update.outer_middleware.register(PostgresStorageMiddleware(self.fsm_storage))
 
         self.dp.message.register(self.cmd_start, Command("start"))
         self.dp.message.register(self.handle_delete, F.text == "Удалить/Завершить голосование")
@@ -101,12 +229,18 @@ class bothandler:
         self.dp.message.register(self.handle_poll_participants_input, StateFilter(self.PollCreation.waiting_for_participants))
         self.dp.message.register(self.handle_data_type_input, StateFilter(self.PollCreation.waiting_for_data_type))
 
-        self.dp.message.register(self.handle_choose_poll, StateFilter(self.Voting.choosing_poll))
-        self.dp.message.register(self.handle_choose_option, StateFilter(self.Voting.choosing_option))
         self.dp.message.register(self.handle_choose_poll_to_manage, StateFilter(self.PollManagement.choosing_poll))
         self.dp.message.register(self.handle_confirm_management, StateFilter(self.PollManagement.confirm_action))
         self.dp.message.register(self.handle_choose_poll_to_add_participant, StateFilter(self.PollManagement.choosing_participant_poll))
         self.dp.message.register(self.handle_add_participants_input, StateFilter(self.PollManagement.adding_participants))
+        self.dp.message.register(self.handle_users_search, StateFilter(self.UserDirectory.browsing))
+
+        self.dp.callback_query.register(self.handle_statistika_page, StatsPage.filter())
+        self.dp.callback_query.register(self.handle_vote_poll, VotePoll.filter())
+        self.dp.callback_query.register(self.handle_vote_polls_page, VotePollPage.filter())
+        self.dp.callback_query.register(self.handle_vote_option, Vote.filter())
+        self.dp.callback_query.register(self.handle_users_page, UserPage.filter())
+        self.dp.callback_query.register(self.handle_user_pick, UserPick.filter())
 
         self.dp.message.register(self.handle_any_message)
 
@@ -115,61 +249,146 @@ class bothandler:
         await message.answer("Выберите действие:", reply_markup=keyboard.get_start_keyboard())
 
     # Основные команды
-    async def cmd_start(self, message: types.Message):
-        logger.log_message(message)
-        await self.upsert_user(message.from_user.id, message.from_user.username)
-        await self.show_main_menu(message)
-
     async def handle_vote(self, message: types.Message, state: FSMContext):
         user_id = message.from_user.id  # Получаем ID пользователя
+        await state.clear()
 
         # Получаем только те голосования, в которых пользователь является участником
-        active_polls = await self.fetch_active_polls(user_id=user_id)
-        if not active_polls:
+        try:
+            polls, has_more = await self.fetch_vote_polls_page(user_id, cursor=0, backward=False)
+        except Exception as e:
+            print(f"Error fetching active polls: {e}")
+            polls, has_more = [], False
+        if not polls:
             await message.answer("⏳ У вас нет активных голосований для участия.")
             return
 
-        # Конструируем список голосований для пользователя
-        polls_list = "\n".join(f"ID: {poll['id']} - {poll['title']}" for poll in active_polls)
+        # Единственное голосование сразу показываем с вариантами ответа
+        if len(polls) == 1 and not has_more:
+            text, markup = await self.render_vote_options(polls[0])
+            await message.answer(text, reply_markup=markup)
+            return
 
         await message.answer(
-            f"📝 Доступные голосования:\n\n{polls_list}\n\nВыберите одно из голосований по ID или названию:",
-            reply_markup=keyboard.get_cancel_keyboard()
+            "📝 Доступные голосования. Выберите голосование:",
+            reply_markup=keyboard.get_vote_polls_keyboard(polls, has_prev=False, has_next=has_more)
         )
-        await state.set_state(self.Voting.choosing_poll)
 
-    async def fetch_active_polls(self, user_id=None):
-        query = """SELECT * FROM polls 
-                WHERE is_active = TRUE AND end_time > NOW()"""
-        params = []
-
-        if user_id:  # Фильтрация по пользователю
-            # Обработка приватных голосований
-            query += """ AND (is_private = FALSE OR id IN (
-                            SELECT poll_id 
-                            FROM poll_participants 
-                            WHERE user_id = $1))"""
-            params.append(user_id)  # Добавляем user_id в список параметров
-
-        async with self.pool.acquire() as conn:
+    async def handle_vote_polls_page(self, callback: types.CallbackQuery, callback_data: VotePollPage):
+        """Листание списка голосований по inline-кнопкам"""
+        backward = callback_data.direction == "prev"
+        try:
+            polls, has_more = await self.fetch_vote_polls_page(callback.from_user.id, callback_data.cursor, backward)
+        except Exception as e:
+            await callback.answer(f"Ошибка при получении голосований: {e}", show_alert=True)
+            return
+
+        if not polls:
+            await callback.answer("Больше голосований нет.")
+            return
+
+        if backward:
+            has_prev, has_next = has_more, True
+        else:
+            has_prev, has_next = True, has_more
+        try:
+            await callback.message.edit_reply_markup(
+                reply_markup=keyboard.get_vote_polls_keyboard(polls, has_prev=has_prev, has_next=has_next)
+            )
+        except TelegramBadRequest:
+            pass  # Страница не изменилась
+        await callback.answer()
+
+    async def fetch_vote_polls_page(self, user_id, cursor, backward):
+        """Загружает одну страницу доступных пользователю голосований с keyset-пагинацией по polls.id.
+
+        Возвращает голосования (по возрастанию ID) и флаг наличия следующей
+        страницы в направлении листания.
+        """
+        page_size = config.сonfig.VOTE_POLLS_PAGE_SIZE
+        polls = await self.db.fetch_all(
+            PollSummary,
+            "vote_polls_page_prev" if backward else "vote_polls_page_next",
+            user_id,
+            cursor,
+            page_size + 1,  # Лишнее голосование показывает, есть ли ещё страница
+            reader=user_id
+        )
+
+        has_more = len(polls) > page_size
+        if has_more:
+            # Отбрасываем лишнее голосование на дальнем от курсора краю
+            polls = polls[1:] if backward else polls[:-1]
+
+        return polls, has_more
+
+    async def render_vote_options(self, poll):
+        options = await self.fetch_poll_options(poll.id)
+        if not options:
+            return "⚠️ Нет вариантов ответа для этого голосования.", None
+        return f"🗳 Голосование: {poll.title}\nВыберите вариант:", keyboard.get_vote_options_keyboard(poll.id, options)
+
+    async def handle_vote_poll(self, callback: types.CallbackQuery, callback_data: VotePoll):
+        """Показывает варианты ответа выбранного голосования inline-кнопками"""
+        poll = await self.fetch_poll(callback_data.poll_id)
+        if not poll or not poll.is_active or datetime.now() > poll.end_time:
+            await callback.answer("⏰ Это голосование уже завершено или не найдено.", show_alert=True)
+            return
+
+        text, markup = await self.render_vote_options(poll)
+        try:
+            await callback.message.edit_text(text, reply_markup=markup)
+        except TelegramBadRequest:
+            pass  # Варианты уже показаны
+        await callback.answer()
+
+    async def handle_vote_option(self, callback: types.CallbackQuery, callback_data: Vote):
+        """Записывает голос одним нажатием: poll_id и option_id приходят в callback_data"""
+        poll_id = callback_data.poll_id
+        user_id = callback.from_user.id
+        try:
+            # Проверка варианта, доступа и активности и запись голоса — одним запросом
+            outcome = await self.submit_vote(poll_id, user_id, callback.from_user.username, option_id=callback_data.option_id)
+        except Exception as e:
+            print(f"Ошибка в обработке выбора варианта: {e}")
+            await callback.answer("Произошла ошибка. Повторите попытку позже.", show_alert=True)
+            return
+
+        if outcome == config.сonfig.VOTE_ACCEPTED:
+            options = await self.fetch_poll_options(poll_id)
+            option_text = next((o.option_text for o in options if o.id == callback_data.option_id), "")
+            logger.log_vote(user_id, poll_id, option_text)
+            await callback.answer("✅ Голос засчитан")
             try:
-                return await conn.fetch(query, *params)  # Используем распаковку параметров
-            except Exception as e:
-                print(f"Error fetching active polls: {e}")
-                return []
-            
-    async def cmd_start(self, message: types.Message):
-        logger.log_message(message)
-        user_id = message.from_user.id
-        username = message.from_user.username
+                await callback.message.edit_text(f"✅ Спасибо! Ваш голос за '{option_text}' засчитан.")
+            except TelegramBadRequest:
+                pass
+            return
 
-        # Проверяем, есть ли пользователь в базе
-        is_new_user = await self.is_new_user(user_id)
+        logger.log_vote_attempt(user_id, outcome)
+        if outcome == config.сonfig.VOTE_ALREADY_VOTED:
+            text = "❌ Вы уже проголосовали в этом голосовании."
+        elif outcome == config.сonfig.VOTE_NO_ACCESS:
+            text = "❌ У вас нет доступа к этому приватному голосованию."
+        elif outcome == config.сonfig.VOTE_INVALID_OPTION:
+            text = "⚠️ Этого варианта больше нет в голосовании."
+        else:
+            text = "⏰ Это голосование уже завершено или не найдено."
+        await callback.answer(text, show_alert=True)
 
-        # Добавляем/обновляем пользователя в базе
-        await self.upsert_user(user_id, username)
+    async def fetch_active_polls(self, user_id=None):
+        try:
+            if user_id:  # Фильтрация по пользователю с учётом приватных голосований
+                return await self.db.fetch_all(PollSummary, "active_polls_for_user", user_id, reader=user_id)
+            return await self.db.fetch_all(PollSummary, "active_polls")
+        except Exception as e:
+            print(f"Error fetching active polls: {e}")
+            return []
+            
+    async def cmd_start(self, message: types.Message, is_new_user: bool = False):
+        logger.log_message(message)
 
-        # Если пользователь новый - показываем приветственное сообщение
+        # Пользователя сохраняет UserMiddleware; если он новый - показываем приветственное сообщение
         if is_new_user:
             welcome_msg = (
                 "Voting Bot - это бот для проведения опросов в телеграмме "
@@ -180,12 +399,6 @@ class bothandler:
         else:
             await self.show_main_menu(message)
 
-    async def is_new_user(self, user_id: int) -> bool:
-        """Проверяет, является ли пользователь новым (отсутствует в базе)"""
-        async with self.pool.acquire() as conn:
-            user = await conn.fetchrow("SELECT 1 FROM users WHERE telegram_id = $1", user_id)
-            return user is None
-
     async def handle_delete(self, message: types.Message, state: FSMContext):
         """Обработка кнопки 'Удалить/Завершить голосование'"""
         data = await state.get_data()
@@ -199,20 +412,14 @@ class bothandler:
             return
 
         polls_list = "\n".join(
-            f"ID: {poll['id']} - {poll['title']} (до {poll['end_time']})"
+            f"ID: {poll.id} - {poll.title} (до {poll.end_time})"
             for poll in polls_to_show
         )
-        await message.answer(f"Ваши голосования для управления:\n\n{polls_list}", reply_markup=keyboard.get_cancel_keyboard())
+        await self.send_long_message(
+            message, f"Ваши голосования для управления:\n\n{polls_list}", reply_markup=keyboard.get_cancel_keyboard()
+        )
         await state.set_state(self.PollManagement.choosing_poll)
 
-    async def fetch_user_polls(self, user_id):
-        async with self.pool.acquire() as conn:
-            try:
-                return await conn.fetch("SELECT * FROM polls WHERE creator_id = $1", user_id)
-            except Exception as e:
-                print(f"Error fetching user polls: {e}")
-                return []
-
     async def handle_choose_poll_to_manage(self, message: types.Message, state: FSMContext):
         """Обработка выбора голосования для управления"""
         user_id = message.from_user.id  # Получаем ID пользователя
@@ -232,18 +439,18 @@ class bothandler:
                 return
                 
             # Сохраняем creator_id для дальнейшей проверки прав
-            creator_id = poll['creator_id']
+            creator_id = poll.creator_id
             if creator_id != user_id:  # Проверка прав на управление
                 await message.answer("❌ У вас нет прав на управление этим голосованием.")
                 await state.set_state(self.PollManagement.choosing_poll)  # Повторно выставляем состояние
                 return
 
             # Определяем статус голосования
-            status_msg = "🔴 Голосование уже завершено" if not poll['is_active'] else "🟢 Голосование активно"
+            status_msg = "🔴 Голосование уже завершено" if not poll.is_active else "🟢 Голосование активно"
 
             # Отправляем пользователю информацию о голосовании и статусе
             await message.answer(
-                f"Голосование #{poll_id}: {poll['title']}\n{status_msg}\nВыберите действие:",
+                f"Голосование #{poll_id}: {poll.title}\n{status_msg}\nВыберите действие:",
                 reply_markup=keyboard.get_confirm_keyboard()  # Отправляем клавиатуру действия
             )
 
@@ -276,26 +483,31 @@ class bothandler:
 
             if message.text == "Удалить":
                 await self.delete_poll(poll_id)  # Удаление из БД
+                self.db.wrote(message.from_user.id)
                 await message.answer(
                     f"Голосование #{poll_id} удалено.",
                     reply_markup=keyboard.get_start_keyboard()
                 )
 
             elif message.text == "Завершить":
-                if datetime.now() > poll['end_time']:
+                if datetime.now() > poll.end_time:
                     await message.answer("Это голосование уже завершено.")
                     await state.clear()
                     return
                 
                 # Завершаем голосование и сохраняем в архив
                 await self.end_poll(poll_id)  # Завершение в БД
+                self.db.wrote(message.from_user.id)
                 
                 await message.answer(
                     f"✅ Голосование #{poll_id} завершено.\n"
-                    f"Название: {poll['title']}",
+                    f"Название: {poll.title}",
                     reply_markup=keyboard.get_start_keyboard()
                 )
 
+            elif message.text == "Результаты онлайн":
+                await self.start_live_results(message, poll_id)
+
             elif message.text == "Отмена":
                 await message.answer("Действие отменено.", reply_markup=keyboard.get_start_keyboard())
             
@@ -309,23 +521,34 @@ class bothandler:
             await state.clear()
 
     async def delete_poll(self, poll_id):
-        async with self.pool.acquire() as conn:
-            try:
-                await conn.execute("DELETE FROM polls WHERE id = $1", poll_id)
-                await conn.execute("DELETE FROM poll_options WHERE poll_id = $1", poll_id)  # Важно!
-                await conn.execute("DELETE FROM votes WHERE poll_id = $1", poll_id)  # Важно!
-                await conn.execute("DELETE FROM poll_participants WHERE poll_id = $1", poll_id)  # Удаляем участников
-                print(f"Голосование {poll_id} удалено из БД.")
-            except Exception as e:
-                print(f"Ошибка при удалении голосования из БД: {e}")
+        try:
+            # Одно соединение и одна транзакция: сначала строки без каскадного удаления,
+            # затем само голосование (варианты, голоса и счётчики удаляются каскадно)
+            async with self.db.acquire() as conn:
+                async with conn.transaction():
+                    await self.db.execute("delete_poll_participants", poll_id, conn=conn)
+                    await self.db.execute("delete_poll_settings", poll_id, conn=conn)
+                    await self.db.execute("delete_poll", poll_id, conn=conn)
+            print(f"Голосование {poll_id} удалено из БД.")
+        except Exception as e:
+            print(f"Ошибка при удалении голосования из БД: {e}")
+        finally:
+            self.invalidate_poll(poll_id)
+            self.expiry_scheduler.discard(poll_id)
+            self.live_results.forget(poll_id)
+        await self.publish_poll_event(config.сonfig.POLL_EVENT_DELETED, [poll_id])
 
     async def end_poll(self, poll_id):
-        async with self.pool.acquire() as conn:
-            try:
-                await conn.execute("UPDATE polls SET is_active = FALSE WHERE id = $1", poll_id)
-                print(f"Голосование {poll_id} завершено в БД.")
-            except Exception as e:
-                print(f"Ошибка при завершении голосования в БД: {e}")
+        try:
+            await self.db.execute("end_poll", poll_id)
+            print(f"Голосование {poll_id} завершено в БД.")
+        except Exception as e:
+            print(f"Ошибка при завершении голосования в БД: {e}")
+        finally:
+            self.invalidate_poll(poll_id)
+            self.expiry_scheduler.discard(poll_id)
+            self.live_results.finish(poll_id)
+        await self.publish_poll_event(config.сonfig.POLL_EVENT_ENDED, [poll_id])
 
     async def handle_create_poll(self, message: types.Message, state: FSMContext):
         user_id = message.from_user.id  # Получение Telegram ID пользователя
@@ -360,9 +583,13 @@ class bothandler:
         data = await state.get_data()
         is_private = data.get('is_private', False)
         if is_private:
-            await message.answer("Введите ID участников (через запятую):")
-            await self.handle_show_users(message)
             await state.set_state(self.PollCreation.waiting_for_participants)  # Переход к вводу участников
+            await state.update_data(participant_ids=[], user_search="")
+            await message.answer(
+                "Выберите участников кнопками. Чтобы найти пользователя, отправьте начало его username, "
+                "или введите ID участников через запятую."
+            )
+            await self.send_users_page(message, state)
         else:
             data_type = data.get('data_type')
             if data_type == "Числовой":
@@ -376,15 +603,17 @@ class bothandler:
         participant_ids = message.text.split(',')
         participant_ids = [pid.strip() for pid in participant_ids]  # Удаляем лишние пробелы
 
-        # Подтвердите, что они все верные ID
+        # Если это не список ID, считаем текст поиском по username
         if not all(pid.isdigit() for pid in participant_ids):
-            await message.answer("Пожалуйста, введите корректные ID участников через запятую.")
-            
-            await self.handle_show_users(message)
+            await self.handle_users_search(message, state)
+            return
         
         # Сохраняем ID участников в состоянии
         await state.update_data(participant_ids=participant_ids)
+        await self.ask_poll_options(message, state)
 
+    async def ask_poll_options(self, message: types.Message, state: FSMContext):
+        """Переход от выбора участников приватного голосования к вводу вариантов."""
         await message.answer("Введите варианты ответов через запятую (например: Да, Нет, Воздержался):", reply_markup=keyboard.get_cancel_keyboard())
         await state.set_state(self.PollCreation.waiting_for_options)
 
@@ -411,17 +640,11 @@ class bothandler:
         await message.answer("Введите продолжительность голосования в часах (1-720):", reply_markup=keyboard.get_cancel_keyboard())
         await state.set_state(self.PollCreation.waiting_for_duration)
 
-    async def upsert_user(self, telegram_id: int, username: str = None):
-        async with self.pool.acquire() as conn:
-            await conn.execute(
-                '''
-                INSERT INTO users (telegram_id, username) 
-                VALUES ($1, $2)
-                ON CONFLICT (telegram_id) DO UPDATE SET username = EXCLUDED.username
-                ''',
-                telegram_id,
-                username
-            )
+    async def upsert_user(self, telegram_id: int, username: str = None) -> bool:
+        """Сохраняет пользователя и возвращает True, если он добавлен впервые."""
+        # xmax = 0 только у только что вставленной строки; без смены username строка не переписывается
+        is_new = await self.db.fetchval("upsert_user", telegram_id, username)
+        return bool(is_new)
 
     async def handle_poll_duration_input(self, message: types.Message, state: FSMContext):
         try:
@@ -438,290 +661,332 @@ class bothandler:
 
         end_time = datetime.now() + timedelta(hours=duration)
 
-        async with self.pool.acquire() as conn:
-            # Здесь сохраняем или обновляем пользователя в таблице
-            await self.upsert_user(user_id, username)
-
-            # Сохраняем опрос
-            poll_id = await conn.fetchval(
-                '''
-                INSERT INTO polls (title, creator_id, end_time, is_active, is_private, data_type)
-                VALUES ($1, $2, $3, TRUE, $4, $5) RETURNING id
-                ''',
-                poll_data['title'],
-                user_id,
-                end_time,
-                poll_data.get('is_private'),
-                poll_data.get('data_type')  # Сохраняем тип данных
-            )
-
-            # Сохраняем варианты опроса
-            for option in poll_data['options']:
-                await conn.execute(
-                    '''
-                    INSERT INTO poll_options (poll_id, option_text) 
-                    VALUES ($1, $2)
-                    ''',
-                    poll_id,
-                    option
-                )
+        # Если голосование приватное, создатель тоже становится участником
+        participant_ids = []
+        if poll_data.get('is_private'):
+            participant_ids = [user_id] + [int(pid) for pid in poll_data.get('participant_ids', [])]
+
+        poll_id = await self.create_poll(
+            user_id,
+            username,
+            poll_data['title'],
+            end_time,
+            poll_data.get('is_private'),
+            poll_data.get('data_type'),  # Сохраняем тип данных
+            poll_data['options'],
+            participant_ids
+        )
 
-            # Если голосование приватное, добавляем создателя в список участников
-            if poll_data.get('is_private'):
-                await conn.execute(
-                    '''
-                    INSERT INTO poll_participants (poll_id, user_id)
-                    VALUES ($1, $2)
-                    ON CONFLICT DO NOTHING
-                    ''',
-                    poll_id,
-                    user_id  # Добавляем создателя голосования
-                )
+        await message.answer(
+            f"✅ Голосование создано!\n"
+            f"ID: #{poll_id}\n"
+            f"Название: {poll_data['title']}\n"
+            f"Варианты: {', '.join(poll_data['options'])}\n"
+            f"Завершится: {end_time.strftime('%d.%m.%Y %H:%M')}",
+            reply_markup=keyboard.get_start_keyboard()
+        )
+        await state.clear()
 
-                # Добавляем остальных участников, если они указаны
-                for pid in poll_data['participant_ids']:
-                    await conn.execute(
-                        '''
-                        INSERT INTO poll_participants (poll_id, user_id)
-                        VALUES ($1, $2)
-                        ON CONFLICT DO NOTHING
-                        ''',
-                        poll_id,
-                        int(pid)
-                    )
+    async def create_poll(self, creator_id, username, title, end_time, is_private, data_type, options, participant_ids):
+        """Создаёт голосование с вариантами и участниками одним запросом.
+
+        Запрос выполняется атомарно: при ошибке не остаётся наполовину созданного голосования.
+        """
+        poll_id = await self.db.fetchval(
+            "create_poll",
+            creator_id,
+            username,
+            title,
+            end_time,
+            is_private,
+            data_type,
+            options,
+            participant_ids
+        )
 
-            await message.answer(
-                f"✅ Голосование создано!\n"
-                f"ID: #{poll_id}\n"
-                f"Название: {poll_data['title']}\n"
-                f"Варианты: {', '.join(poll_data['options'])}\n"
-                f"Завершится: {end_time.strftime('%d.%m.%Y %H:%M')}",
-                reply_markup=keyboard.get_start_keyboard()
-            )
-            await state.clear()
+        self.db.wrote(creator_id)
+        self.expiry_scheduler.schedule(poll_id, end_time)
+        await self.publish_poll_event(config.сonfig.POLL_EVENT_CREATED, [poll_id], end_time=end_time.isoformat())
+        return poll_id
 
-    async def handle_choose_poll(self, message: types.Message, state: FSMContext):
-        user_id = message.from_user.id
-        user_input = message.text.strip()  # Remove extra spaces
+    async def add_poll_participants(self, poll_id, participant_ids):
+        """Добавляет участников к приватному голосованию одним запросом."""
+        await self.db.execute("add_poll_participants", poll_id, participant_ids)
+        await self.publish_poll_event(config.сonfig.POLL_EVENT_PARTICIPANTS, [poll_id])
 
-        # Check if the input is a number (poll ID) or a title
-        if user_input.isdigit():
-            poll_id = int(user_input)
-            poll = await self.fetch_poll(poll_id)
-        else:
-            poll = await self.fetch_poll_by_title(user_input)
+    async def fetch_poll_options(self, poll_id):
+        options = self.options_cache.get(poll_id)
+        if options is not None:
+            return options
 
-        if not poll or not poll['is_active'] or datetime.now() > poll['end_time']:
-            await message.answer("⏰ Это голосование уже завершено или не найдено.")
-            await self.show_main_menu(message)
-            await state.clear()
-            return
+        try:
+            options = tuple(await self.db.fetch_all(PollOption, "poll_options", poll_id))
+        except Exception as e:
+            print(f"Error fetching poll options: {e}")
+            return ()
 
-        # Проверяем, если голосование приватное
-        if poll['is_private']:
-            # Проверка, существует ли пользователь в списке участников
-            participant = await self.pool.fetchrow(
-                "SELECT 1 FROM poll_participants WHERE poll_id = $1 AND user_id = $2",
-                poll['id'], user_id
-            )
-            if not participant:
-                await message.answer("❌ У вас нет доступа к этому приватному голосованию.")
-                await self.show_main_menu(message)
-                await state.clear()
-                return
+        if options:
+            self.options_cache.set(poll_id, options)
+        return options
 
-        # Проверяем, уже проголосовал ли этот пользователь
-        async with self.pool.acquire() as conn:
-            existing_vote = await conn.fetchrow(
-                "SELECT option_id FROM votes WHERE poll_id = $1 AND user_id = $2", poll['id'], user_id
-            )
-            if existing_vote:
-                await message.answer("❌ Вы уже проголосовали в этом голосовании.")
-                await self.show_main_menu(message)  # Возврат в главное меню
-                await state.clear()
-                return
+    async def fetch_poll(self, poll_id):
+        poll = self.poll_cache.get(poll_id)
+        if poll is not None:
+            return poll
 
-        # Если голосование активно и пользователь еще не голосовал, показываем варианты
-        await state.update_data(poll_id=poll['id'])
-        options = await self.fetch_poll_options(poll['id'])
-        if not options:
-            await message.answer("⚠️ Нет вариантов ответа для этого голосования.")
-            await state.clear()
-            return
+        try:
+            poll = await self.db.fetch_one(Poll, "poll", poll_id)
+        except Exception as e:
+            print(f"Error fetching poll: {e}")
+            return None
 
-        options_list = [option['option_text'] for option in options]
-        await message.answer(
-            f"🗳 Голосование: {poll['title']}\nВыберите вариант:",
-            reply_markup=keyboard.get_poll_options_keyboard(options_list)
-        )
+        if poll:
+            self.poll_cache.set(poll_id, poll)
+        return poll
 
-        await state.set_state(self.Voting.choosing_option)
+    def invalidate_poll(self, poll_id):
+        """Удаляет голосование и его варианты из локального кэша."""
+        self.poll_cache.pop(poll_id)
+        self.options_cache.pop(poll_id)
 
-    async def fetch_poll_by_title(self, title):
-        async with self.pool.acquire() as conn:
-            try:
-                return await conn.fetchrow("SELECT * FROM polls WHERE title ILIKE $1", title)
-            except Exception as e:
-                print(f"Error fetching poll by title: {e}")
-                return None
+    async def handle_cancel(self, message: types.Message, state: FSMContext):
+        logger.log_message(message)
+        await state.clear()
+        await self.show_main_menu(message)
 
-    async def fetch_poll_options(self, poll_id):
-        async with self.pool.acquire() as conn:
-            try:
-                return await conn.fetch("SELECT * FROM poll_options WHERE poll_id = $1", poll_id)
-            except Exception as e:
-                print(f"Error fetching poll options: {e}")
-                return []
-            
-    async def fetch_poll(self, poll_id):
-        async with self.pool.acquire() as conn:
-            try:
-                return await conn.fetchrow("SELECT * FROM polls WHERE id = $1", poll_id)
-            except Exception as e:
-                print(f"Error fetching poll: {e}")
-                return None
+    async def handle_statistika(self, message: types.Message):
+        logger.log_message(message)
+        user_id = message.from_user.id  # Get current user ID
 
-    async def handle_choose_option(self, message: types.Message, state: FSMContext):
         try:
-            data = await state.get_data()
-            poll_id = data['poll_id']
-            user_id = message.from_user.id
+            text, markup = await self.render_statistics_page(user_id, cursor=0, backward=False)
+        except Exception as e:
+            await message.answer(f"Ошибка при получении статистики: {e}")
+            return
 
-            # Получаем варианты голосования
-            options = await self.fetch_poll_options(poll_id)
-            option_dict = {option['option_text']: option['id'] for option in options}
+        if text is None:
+            await message.answer("Не найдено ни одного голосования.")
+            return
 
-            # Убедитесь, что пользователь существует в базе
-            username = message.from_user.username  # Получаем имя пользователя
-            await self.upsert_user(user_id, username)
+        await message.answer(text, reply_markup=markup)
 
-            # Проверяем, уже проголосовал ли этот пользователь
-            async with self.pool.acquire() as conn:
-                existing_vote = await conn.fetchrow(
-                    "SELECT option_id FROM votes WHERE poll_id = $1 AND user_id = $2", poll_id, user_id
-                )
-                if existing_vote:
-                    await message.answer("❌ Вы уже проголосовали в этом голосовании.")
-                    await self.show_main_menu(message)  # Возврат в главное меню
-                    await state.clear()
-                    return
+    async def handle_statistika_page(self, callback: types.CallbackQuery, callback_data: StatsPage):
+        """Листание страниц статистики по inline-кнопкам"""
+        try:
+            text, markup = await self.render_statistics_page(
+                callback.from_user.id,
+                cursor=callback_data.cursor,
+                backward=callback_data.direction == "prev"
+            )
+        except Exception as e:
+            await callback.answer(f"Ошибка при получении статистики: {e}", show_alert=True)
+            return
 
-                if message.text not in option_dict:
-                    await message.answer("⚠️ Пожалуйста, выберите вариант из предложенных.")
-                    return
+        if text is None:
+            await callback.answer("Больше голосований нет.")
+            return
 
-                selected_option_id = option_dict[message.text]
-
-                # Запись голоса пользователя в БД
-                await conn.execute(
-                    '''
-                    INSERT INTO votes (poll_id, user_id, option_id)
-                    VALUES ($1, $2, $3)
-                    ON CONFLICT (poll_id, user_id) DO NOTHING
-                    ''',
-                    poll_id,
-                    user_id,
-                    selected_option_id
-                )
+        try:
+            await callback.message.edit_text(text, reply_markup=markup)
+        except TelegramBadRequest:
+            pass  # Страница не изменилась
+        await callback.answer()
+
+    async def render_statistics_page(self, user_id, cursor, backward):
+        """Формирует текст и клавиатуру одной страницы статистики.
+
+        Возвращает (None, None), если на странице нет голосований.
+        """
+        page_size = config.сonfig.STATS_PAGE_SIZE
+        tallies, has_more = await self.fetch_statistics_page(user_id, cursor, backward, page_size)
+        if not tallies:
+            return None, None
+
+        # Голосования добавляются от курсора, пока текст помещается в сообщение;
+        # не поместившиеся останутся для следующей страницы, а не пропадут
+        max_length = 4096
+        blocks = []
+        length = 0
+        for tally in reversed(tallies) if backward else tallies:
+            block = self.format_poll_stats(tally)
+            if blocks and length + len(block) > max_length:
+                has_more = True
+                break
+            blocks.append(block)
+            length += len(block)
+        shown = tallies[-len(blocks):] if backward else tallies[:len(blocks)]
+        text = "".join(reversed(blocks) if backward else blocks)
+        if len(text) > max_length:
+            # Одно голосование длиннее сообщения: обрезается только оно само
+            text = text[:max_length - 1] + "…"
+
+        if backward:
+            has_prev, has_next = has_more, True
+        else:
+            has_prev, has_next = cursor > 0, has_more
+
+        markup = keyboard.get_stats_page_keyboard(shown[0].id, shown[-1].id, has_prev, has_next)
+        return text, markup
+
+    async def fetch_statistics_page(self, user_id, cursor, backward, page_size):
+        """Загружает одну страницу статистики с keyset-пагинацией по polls.id.
+
+        Возвращает результаты голосований (по возрастанию ID) и флаг наличия
+        следующей страницы в направлении листания.
+        """
+        tallies = await self.db.fetch_tallies(
+            "statistics_page_prev" if backward else "statistics_page_next",
+            user_id,
+            cursor,
+            page_size + 1,  # Лишнее голосование показывает, есть ли ещё страница
+            reader=user_id
+        )
 
-            await message.answer(f"✅ Спасибо! Ваш голос за '{message.text}' засчитан.", reply_markup=keyboard.get_start_keyboard())
-            await state.clear()
+        has_more = len(tallies) > page_size
+        if has_more:
+            # Отбрасываем лишнее голосование на дальнем от курсора краю
+            tallies = tallies[1:] if backward else tallies[:-1]
 
-        except Exception as e:
-            print(f"Ошибка в обработке выбора варианта: {e}")
-            await message.answer("Произошла ошибка. Повторите попытку позже.")
-            await state.clear()
+        return tallies, has_more
 
-    async def handle_cancel(self, message: types.Message, state: FSMContext):
-        logger.log_message(message)
-        await state.clear()
+    async def fetch_poll_stats(self, poll_id):
+        """Загружает статистику одного голосования или None, если его нет."""
+        tallies = await self.db.fetch_tallies("poll_stats", poll_id)
+        return tallies[0] if tallies else None
+
+    async def start_live_results(self, message: types.Message, poll_id):
+        """Публикует сообщение с результатами, которое бот правит по мере голосования"""
+        tally = await self.fetch_poll_stats(poll_id)
+        if tally is None:
+            await message.answer("Голосование не найдено.")
+            return
+
+        text = self.format_poll_stats(tally)
+        sent = await message.answer(text)
+        await self.db.execute("save_live_results", poll_id, sent.chat.id, sent.message_id)
+        self.live_results.track(poll_id, sent.chat.id, sent.message_id, tally, text)
+        await self.publish_poll_event(
+            config.сonfig.POLL_EVENT_LIVE, [poll_id], chat_id=sent.chat.id, message_id=sent.message_id
+        )
         await self.show_main_menu(message)
 
-    async def handle_statistika(self, message: types.Message):
-        logger.log_message(message)
-        user_id = message.from_user.id  # Get current user ID
+    async def edit_live_results(self, chat_id, message_id, text):
+        with bulk():  # Фоновая правка пропускает вперёд ответы пользователям
+            await self.bot.edit_message_text(text=text, chat_id=chat_id, message_id=message_id)
+
+    async def claim_live_results(self, poll_ids):
+        return await self.invalidation_bus.claim("live_results", poll_ids)
+
+    async def release_live_results(self, poll_ids):
+        await self.invalidation_bus.release("live_results", poll_ids)
+
+    async def delegate_live_results(self, poll_ids):
+        """Передаёт голоса по чужим живым сообщениям их владельцам."""
+        await self.publish_poll_event(config.сonfig.POLL_EVENT_VOTED, poll_ids)
+
+    async def load_live_results(self):
+        """Загружает живые сообщения активных голосований."""
+        rows = await self.db.fetch("active_live_results")
+        for row in rows:
+            self.live_results.track(row['poll_id'], row['chat_id'], row['message_id'])
+
+    @staticmethod
+    def format_poll_stats(tally):
+        total_votes = tally.votes
+        option_strings = [
+            f"  • {option}: {votes} ({(votes / total_votes * 100) if total_votes > 0 else 0:.1f}%)"
+            for option, votes in tally.options
+        ]
+
+        status = "🔴 Завершено" if not tally.is_active else "🟢 Активно"
+
+        return (
+            f"📌 #{tally.id}: {tally.title}\n"
+            f"Создано: {tally.created_at.strftime('%d.%m.%Y %H:%M')}\n"
+            f"Завершится: {tally.end_time.strftime('%d.%m.%Y %H:%M')}\n"
+            f"Статус: {status}\n"
+            f"Всего голосов: {total_votes}\n"
+            f"{''.join([s + '\n' for s in option_strings])}\n"
+        )
 
-        async with self.pool.acquire() as conn:
-            try:
-                all_polls = await conn.fetch(
-                    """
-                    SELECT
-                        p.id,
-                        p.title,
-                        p.created_at,
-                        p.end_time,
-                        po.option_text,
-                        COUNT(v.option_id) AS votes_count,
-                        CASE WHEN p.is_active THEN true ELSE false END AS is_active
-                    FROM
-                        polls p
-                    JOIN
-                        poll_options po ON p.id = po.poll_id
-                    LEFT JOIN
-                        votes v ON po.id = v.option_id
-                    WHERE
-                        (p.is_private = false OR p.id IN (
-                            SELECT poll_id FROM poll_participants WHERE user_id = $1
-                        ))
-                    GROUP BY
-                        p.id, po.id
-                    ORDER BY
-                        p.id;
-                    """,
-                    user_id
-                )
+    async def submit_vote(self, poll_id, user_id, username, option_id):
+        """Принимает голос и возвращает один из исходов config.сonfig.VOTE_*.
 
-                if not all_polls:
-                    await message.answer("Не найдено ни одного голосования.")
+        В режиме отложенной записи голос попадает в буфер и ответ приходит
+        только после того, как пачка с ним записана в БД.
+        """
+        vote = (poll_id, user_id, username, option_id)
+        if self.vote_buffer:
+            outcome = await self.vote_buffer.submit(vote)
+        else:
+            outcome = (await self.submit_votes([vote]))[0]
+        if outcome == config.сonfig.VOTE_ACCEPTED:
+            self.db.wrote(user_id)  # Свой голос пользователь должен увидеть сразу
+            self.live_results.notify(poll_id)
+        return outcome
+
+    async def submit_votes(self, votes):
+        """Атомарно записывает пачку голосов одним запросом к БД.
+
+        Для каждого голоса (poll_id, user_id, username, option_id) проверяет активность
+        голосования, доступ к приватному голосованию и вариант ответа, сохраняет пользователя,
+        записывает голос и увеличивает шард счётчика варианта. Вариант задаётся option_id
+        inline-кнопки. Возвращает исходы в порядке голосов.
+        """
+        poll_ids, user_ids, usernames, option_ids = (list(column) for column in zip(*votes))
+        rows = await self.db.fetch(
+            "submit_votes",
+            poll_ids,
+            user_ids,
+            usernames,
+            option_ids,
+            config.сonfig.VOTE_COUNTER_SHARDS,
+            config.сonfig.VOTE_POLL_CLOSED,
+            config.сonfig.VOTE_NO_ACCESS,
+            config.сonfig.VOTE_ALREADY_VOTED,
+            config.сonfig.VOTE_INVALID_OPTION,
+            config.сonfig.VOTE_ACCEPTED
+        )
+        return [row['outcome'] for row in rows]
+
+    async def check_vote_counters(self):
+        """Возвращает голосования, у которых счётчики расходятся с таблицей votes."""
+        rows = await self.db.fetch("check_vote_counters")
+        return [row['poll_id'] for row in rows]
+
+    async def rebuild_vote_counters(self, poll_ids=None):
+        """Пересчитывает счётчики голосов из таблицы votes (для всех или выбранных голосований)."""
+        async with self.db.acquire() as conn:
+            async with conn.transaction():
+                # Блокируем запись новых голосов на время пересчёта
+                await self.db.execute("lock_vote_counters", conn=conn)
+                if poll_ids is None:
+                    await self.db.execute("delete_all_vote_counters", conn=conn)
+                    await self.db.execute("rebuild_all_vote_counters", conn=conn)
+                else:
+                    await self.db.execute("delete_vote_counters", poll_ids, conn=conn)
+                    await self.db.execute("rebuild_vote_counters", poll_ids, conn=conn)
+
+    async def reconcile_vote_counters(self):
+        """Сверяет счётчики голосов с таблицей votes и пересчитывает расходящиеся.
+
+        Сверка читает все голоса, поэтому её выполняет только один процесс:
+        остальные, не получив advisory-блокировку, пропускают сверку.
+        """
+        try:
+            async with self.db.acquire() as lock_conn:
+                if not await self.db.fetchval("try_lock_reconcile_vote_counters", conn=lock_conn):
+                    print("Сверка счётчиков голосов уже выполняется другим процессом")
                     return
-
-                polls_stats = {}
-
-                for poll in all_polls:
-                    poll_id = poll['id']
-                    if poll_id not in polls_stats:
-                        polls_stats[poll_id] = {
-                            "title": poll['title'],
-                            "created_at": poll['created_at'],
-                            "end_time": poll['end_time'],
-                            "votes": 0,
-                            "is_active": poll['is_active'],
-                            "options": {}
-                        }
-
-                    option = poll['option_text']
-                    votes = poll['votes_count']
-
-                    polls_stats[poll_id]["votes"] += votes
-                    polls_stats[poll_id]["options"][option] = votes
-
-                for poll_id, stats in polls_stats.items():
-                    options_stats = stats["options"]
-                    total_votes = stats["votes"]
-                    option_strings = [
-                        f"  • {option}: {votes} ({(votes / total_votes * 100) if total_votes > 0 else 0:.1f}%)"
-                        for option, votes in options_stats.items()
-                    ]
-
-                    status = "🔴 Завершено" if not stats["is_active"] else "🟢 Активно"
-
-                    response = (
-                        f"📌 #{poll_id}: {stats['title']}\n"
-                        f"Создано: {stats['created_at'].strftime('%d.%m.%Y %H:%M')}\n"
-                        f"Завершится: {stats['end_time'].strftime('%d.%m.%Y %H:%M')}\n"
-                        f"Статус: {status}\n"
-                        f"Всего голосов: {total_votes}\n"
-                        f"{''.join([s + '\n' for s in option_strings])}\n"
-                    )
-
-                    await self.send_long_message(message, response)  # Send stats
-
-            except Exception as e:
-                await message.answer(f"Ошибка при получении статистики: {e}")
-
-    async def count_votes(self, poll_id):
-        async with self.pool.acquire() as conn:
-            return await conn.fetchval('SELECT COUNT(*) FROM votes WHERE poll_id = $1', poll_id)
+                try:
+                    poll_ids = await self.check_vote_counters()
+                    if poll_ids:
+                        await self.rebuild_vote_counters(poll_ids)
+                        print(f"Счётчики голосов пересчитаны для голосований: {poll_ids}")
+                finally:
+                    await self.db.fetchval("unlock_reconcile_vote_counters", conn=lock_conn)
+        except Exception as e:
+            print(f"Ошибка при сверке счётчиков голосов: {e}")
 
     async def handle_help(self, message: types.Message):
         logger.log_message(message)
@@ -766,18 +1031,19 @@ class bothandler:
             return
 
         # Формируем список приватных голосований
-        polls_list = "\n".join(f"ID: {poll['id']} - {poll['title']}" for poll in user_priv_polls)
-        await message.answer(f"Ваши приватные голосования:\n\n{polls_list}\n\nВыберите одно из них, чтобы добавить участников:")
+        polls_list = "\n".join(f"ID: {poll.id} - {poll.title}" for poll in user_priv_polls)
+        await self.send_long_message(
+            message, f"Ваши приватные голосования:\n\n{polls_list}\n\nВыберите одно из них, чтобы добавить участников:"
+        )
 
         await state.set_state(self.PollManagement.choosing_participant_poll)
 
     async def fetch_active_priv_polls(self, user_id):
-        async with self.pool.acquire() as conn:
-            try:
-                return await conn.fetch("SELECT * FROM polls WHERE is_active = TRUE AND is_private = TRUE AND creator_id = $1", user_id)
-            except Exception as e:
-                print(f"Error fetching private polls: {e}")
-                return []
+        try:
+            return await self.db.fetch_all(PollSummary, "active_private_polls", user_id, reader=user_id)
+        except Exception as e:
+            print(f"Error fetching private polls: {e}")
+            return []
 
     async def handle_choose_poll_to_add_participant(self, message: types.Message, state: FSMContext):
         """Обработка выбора голосования для добавления участников"""
@@ -785,45 +1051,29 @@ class bothandler:
             poll_id = int(message.text)  # Получаем ID голосования из текста сообщения
             poll = await self.fetch_poll(poll_id)
 
-            if not poll or not poll['is_private']:
+            if not poll or not poll.is_private:
                 await message.answer("Голосование не найдено или оно не является приватным.")
                 return
             
             # Сначала проверьте, является ли пользователь создателем голосования
             user_id = message.from_user.id
-            if poll['creator_id'] != user_id:
+            if poll.creator_id != user_id:
                 await message.answer("❌ У вас нет прав на управление этим голосованием.")
                 return
 
-            # Показываем текстовое сообщение для ввода ID участников
-            await message.answer("Введите ID участников через запятую (например: 123456, 789012): ")
-            
-            """Обработка команды для показа всех пользователей."""
-            users = await self.fetch_all_users()  # Получаем всех пользователей из БД
-            if not users:
-                await message.answer("Не найдено пользователей.")
-                return
-
-            # Формируем ответ
-            users_list = "\n".join(f"ID: {user['telegram_id']} - {user['username'] or 'Без имени'}" for user in users)
-            await message.answer(f"Список пользователей:\n\n{users_list}")
-
             # Сохраняем poll_id для дальнейшего использования
-            await state.update_data(poll_id=poll_id)
+            await state.update_data(poll_id=poll_id, participant_ids=[], user_search="")
             await state.set_state(self.PollManagement.adding_participants)
 
+            await message.answer(
+                "Выберите участников кнопками. Чтобы найти пользователя, отправьте начало его username, "
+                "или введите ID участников через запятую (например: 123456, 789012)."
+            )
+            await self.send_users_page(message, state)
+
         except ValueError:
             await message.answer("Пожалуйста, введите корректный ID голосования.")
 
-    async def fetch_all_users(self):
-        """Получение всех пользователей из БД"""
-        async with self.pool.acquire() as conn:
-            try:
-                return await conn.fetch("SELECT * FROM users")
-            except Exception as e:
-                print(f"Error fetching users: {e}")
-                return []
-
     async def handle_add_participants_input(self, message: types.Message, state: FSMContext):
         """Обработка добавления участника к приватному голосованию"""
         data = await state.get_data()
@@ -834,75 +1084,223 @@ class bothandler:
             participant_ids = message.text.split(',')
             participant_ids = [pid.strip() for pid in participant_ids]  # Удаляем лишние пробелы
 
-            # Подтвердите, что они все верные ID
+            # Если это не список ID, считаем текст поиском по username
             if not all(pid.isdigit() for pid in participant_ids):
-                await message.answer("Пожалуйста, введите корректные ID участников через запятую.")
+                await self.handle_users_search(message, state)
                 return
             
             # Сохраняем ID участников в состоянии
             await state.update_data(participant_ids=participant_ids)
-
-            # Добавляем участников в базу данных
-            async with self.pool.acquire() as conn:
-                for pid in participant_ids:
-                    await conn.execute(
-                        '''
-                        INSERT INTO poll_participants (poll_id, user_id)
-                        VALUES ($1, $2)
-                        ON CONFLICT DO NOTHING
-                        ''',
-                        poll_id,
-                        int(pid)  # используем int, чтобы это соответствовало BIGINT в БД
-                    )
-            
-            await message.answer("✅ Участники успешно добавлены к приватному голосованию.", reply_markup=keyboard.get_start_keyboard())
-            await state.clear()
+            await self.save_added_participants(message, state, message.from_user.id, poll_id, participant_ids)
         else:
             await message.answer("⚠️ Пожалуйста, введите ID участников.")
 
-    async def update_polls(self):
-        await asyncio.sleep(10)  # Обновляем информацию о голосованиях каждые 10с
-        await self.update_active_polls()
-        await self.update_archived_polls()
+    async def load_poll_deadlines(self):
+        """Загружает сроки всех активных голосований в планировщик завершения."""
+        polls = await self.db.fetch("active_poll_deadlines")
+        for poll in polls:
+            self.expiry_scheduler.schedule(poll['id'], poll['end_time'])
+
+    async def close_expired_polls(self, now):
+        """Одним запросом завершает все голосования, срок которых наступил."""
+        closed = await self.db.fetch("close_expired_polls", now)
+        closed_ids = [poll['id'] for poll in closed]
+        for poll_id in closed_ids:
+            self.invalidate_poll(poll_id)
+            self.live_results.finish(poll_id)
+        if closed_ids:
+            print(f"Голосования {closed_ids} завершены по сроку.")
+            await self.publish_poll_event(config.сonfig.POLL_EVENT_ENDED, closed_ids)
+        return closed_ids
+
+    async def publish_poll_event(self, event, poll_ids, **data):
+        """Оповещает остальные экземпляры бота об изменении голосований."""
+        if not self.invalidation_bus:
+            return
+        try:
+            await self.invalidation_bus.publish(event, poll_ids, **data)
+        except Exception as e:
+            print(f"Ошибка при публикации события {event}: {e}")
 
-    async def update_active_polls(self):
-        # находит все активные, которые уже должны быть завершены
-        async with self.pool.acquire() as conn:
-            try:
-                expired_polls = await conn.fetch("SELECT id FROM polls WHERE is_active = TRUE AND end_time <= NOW()")
-                for poll in expired_polls:
-                    await self.end_poll(poll['id'])
-            except Exception as e:
-                print(f"Error updating active polls: {e}")
-
-    async def update_archived_polls(self):
-        async with self.pool.acquire() as conn:
-            try:
-                archived_polls = await conn.fetch("SELECT * FROM polls WHERE is_active = FALSE AND end_time <= NOW()")
-                for poll in archived_polls:
-                    # Обновляем информацию о голосовании в БД
-                    await conn.execute("UPDATE polls SET last_updated = NOW() WHERE id = $1", poll['id'])
-            except Exception as e:
-                print(f"Error updating archived polls: {e}")
-
-    async def handle_show_users(self, message: types.Message):
+    def apply_poll_event(self, event, poll_ids, data):
+        """Применяет событие другого экземпляра бота к локальным кэшам и планировщику."""
+        if event == config.сonfig.POLL_EVENT_VOTED:
+            for poll_id in poll_ids:
+                self.live_results.notify_remote(poll_id)  # Голосование не менялось: кэши остаются
+            return
+        for poll_id in poll_ids:
+            self.invalidate_poll(poll_id)
+            if event == config.сonfig.POLL_EVENT_CREATED:
+                self.expiry_scheduler.schedule(poll_id, datetime.fromisoformat(data['end_time']))
+            elif event == config.сonfig.POLL_EVENT_ENDED:
+                self.expiry_scheduler.discard(poll_id)
+                self.live_results.finish(poll_id)  # Итог дорисует владелец сообщения
+            elif event == config.сonfig.POLL_EVENT_DELETED:
+                self.expiry_scheduler.discard(poll_id)
+                self.live_results.forget(poll_id)
+            elif event == config.сonfig.POLL_EVENT_LIVE:
+                self.live_results.track(poll_id, data['chat_id'], data['message_id'])
+
+    async def reset_local_state(self):
+        """Сбрасывает локальные кэши, если события других экземпляров могли быть пропущены."""
+        self.poll_cache.clear()
+        self.options_cache.clear()
+        self.live_results.disown()  # Блокировки владельцев снялись вместе со старым соединением шины
+        await self.load_poll_deadlines()
+        await self.load_live_results()
+
+    async def save_added_participants(self, message: types.Message, state: FSMContext, user_id, poll_id, participant_ids):
+        # Добавляем участников в базу данных; user_id — кто добавляет (после кнопки
+        # «Готово» message — сообщение бота, и его from_user — сам бот)
+        await self.add_poll_participants(poll_id, [int(pid) for pid in participant_ids])  # int соответствует BIGINT в БД
+        self.db.wrote(user_id)
+
+        await message.answer("✅ Участники успешно добавлены к приватному голосованию.", reply_markup=keyboard.get_start_keyboard())
+        await state.clear()
+
+    async def handle_show_users(self, message: types.Message, state: FSMContext):
         """Обработка команды для показа всех пользователей."""
-        users = await self.fetch_all_users()  # Получаем всех пользователей из БД
-        if not users:
+        await state.set_state(self.UserDirectory.browsing)
+        await state.update_data(user_search="")
+        await message.answer(
+            "Чтобы найти пользователя, отправьте начало его username.",
+            reply_markup=keyboard.get_cancel_keyboard()
+        )
+        await self.send_users_page(message, state)
+
+    async def handle_users_search(self, message: types.Message, state: FSMContext):
+        """Поиск пользователей по началу username."""
+        await state.update_data(user_search=message.text.strip().lstrip("@").lower())
+        await self.send_users_page(message, state)
+
+    async def send_users_page(self, message: types.Message, state: FSMContext):
+        text, markup = await self.render_users_page(state, key="", user_id=0, backward=False)
+        if text is None:
             await message.answer("Не найдено пользователей.")
             return
+        await message.answer(text, reply_markup=markup)
+
+    async def handle_users_page(self, callback: types.CallbackQuery, callback_data: UserPage, state: FSMContext):
+        """Листание списка пользователей по inline-кнопкам"""
+        text, markup = await self.render_users_page(
+            state,
+            key=callback_data.key,
+            user_id=callback_data.user_id,
+            backward=callback_data.direction == "prev"
+        )
+        if text is None:
+            await callback.answer("Больше пользователей нет.")
+            return
+
+        try:
+            await callback.message.edit_text(text, reply_markup=markup)
+        except TelegramBadRequest:
+            pass  # Страница не изменилась
+        await callback.answer()
+
+    async def handle_user_pick(self, callback: types.CallbackQuery, callback_data: UserPick, state: FSMContext):
+        """Отметка участника приватного голосования inline-кнопкой"""
+        current_state = await state.get_state()
+        if current_state not in (self.PollCreation.waiting_for_participants.state, self.PollManagement.adding_participants.state):
+            await callback.answer("Выбор участников уже завершён.")
+            return
 
-        # Формируем ответ
-        users_list = "\n".join(f"ID: {user['telegram_id']} - {user['username'] or 'Без имени'}" for user in users)
-        await message.answer(f"Список пользователей:\n\n{users_list}")
+        data = await state.get_data()
+        participant_ids = data.get('participant_ids', [])
 
-    async def send_long_message(self, message: types.Message, text: str):
-        """Отправляет сообщение по частям, если оно слишком длинное."""
-        max_length = 4096
-        parts = [text[i:i + max_length] for i in range(0, len(text), max_length)]
-        
-        for part in parts:
-            await message.answer(part)
+        if callback_data.user_id == 0:  # Кнопка "Готово"
+            if not participant_ids:
+                await callback.answer("Выберите хотя бы одного участника.")
+                return
+            await callback.answer()
+            await callback.message.edit_reply_markup(reply_markup=None)
+            if current_state == self.PollCreation.waiting_for_participants.state:
+                await self.ask_poll_options(callback.message, state)
+            else:
+                await self.save_added_participants(callback.message, state, callback.from_user.id, data['poll_id'], participant_ids)
+            return
+
+        pid = str(callback_data.user_id)
+        if pid in participant_ids:
+            participant_ids.remove(pid)
+        else:
+            participant_ids.append(pid)
+        await state.update_data(participant_ids=participant_ids)
+
+        # Перерисовываем текущую страницу тем же запросом, которым она была получена
+        key, user_id, backward = data.get('users_page', ["", 0, False])
+        text, markup = await self.render_users_page(state, key=key, user_id=user_id, backward=backward)
+        if text is not None:
+            try:
+                await callback.message.edit_text(text, reply_markup=markup)
+            except TelegramBadRequest:
+                pass
+        await callback.answer()
+
+    async def render_users_page(self, state: FSMContext, key, user_id, backward):
+        """Формирует текст и клавиатуру одной страницы списка пользователей.
+
+        Поиск и отмеченные участники берутся из состояния. Возвращает (None, None),
+        если на странице нет пользователей.
+        """
+        data = await state.get_data()
+        search = data.get('user_search', "")
+        selectable = await state.get_state() in (
+            self.PollCreation.waiting_for_participants.state,
+            self.PollManagement.adding_participants.state,
+        )
+        selected = {int(pid) for pid in data.get('participant_ids', [])}
+
+        page_size = config.сonfig.USERS_PAGE_SIZE
+        users, has_more = await self.fetch_users_page(search, key, user_id, backward, page_size)
+        if not users:
+            return None, None
+
+        if backward:
+            has_prev, has_next = has_more, True
+        else:
+            has_prev, has_next = bool(key or user_id), has_more
+        await state.update_data(users_page=[key, user_id, backward])
+
+        title = f"Пользователи по запросу «{search}»" if search else "Пользователи"
+        users_list = "\n".join(
+            f"{'✅ ' if user.telegram_id in selected else ''}ID: {user.telegram_id} - {user.username or 'Без имени'}"
+            for user in users
+        )
+        markup = keyboard.get_users_page_keyboard(users, selected, has_prev, has_next, selectable)
+        return f"{title}:\n\n{users_list}", markup
+
+    async def fetch_users_page(self, search, key, user_id, backward, page_size):
+        """Загружает страницу пользователей с keyset-пагинацией по (username, telegram_id).
+
+        Поиск по началу username — диапазон по тому же ключу, поэтому и поиск, и
+        листание идут по индексу ix_users_username_key за время, не зависящее от
+        числа пользователей. Возвращает пользователей по возрастанию ключа и флаг
+        наличия следующей страницы в направлении листания.
+        """
+        rows = await self.db.fetch_all(
+            User,
+            "users_page_prev" if backward else "users_page_next",
+            search,
+            search + "\U0010ffff",  # Верхняя граница диапазона строк, начинающихся с search
+            key,
+            user_id,
+            page_size + 1
+        )
+
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backward:
+            rows.reverse()
+        return rows, has_more
+
+    async def send_long_message(self, message: types.Message, text: str, reply_markup=None):
+        """Отправляет сообщение по частям, если оно слишком длинное; клавиатура — у последней части."""
+        *head, last = split_text(text)
+        with bulk():  # Длинный вывод не задерживает ответы другим пользователям
+            for part in head:
+                await message.answer(part)
+        await message.answer(last, reply_markup=reply_markup)
 
     async def handle_data_type_input(self, message: types.Message, state: FSMContext):
         if message.text not in ["Числовой", "Строчный"]:
@@ -914,11 +1312,87 @@ class bothandler:
         await message.answer("Введите название голосования:", reply_markup=keyboard.get_cancel_keyboard())
         await state.set_state(self.PollCreation.waiting_for_title)
 
-    async def run(self): 
+    async def startup(self):
+        """Поднимает пул БД и фоновые службы экземпляра бота."""
         await self.init_db()
+        if self.replica:
+            self.replica.start()
+        if config.сonfig.VOTE_COUNTERS_RECONCILE_ON_START:
+            await self.reconcile_vote_counters()
+        if config.сonfig.VOTE_BUFFER_ENABLED:
+            self.vote_buffer = votebuffer(
+                self.submit_votes,
+                flush_interval=config.сonfig.VOTE_BUFFER_FLUSH_MS / 1000,
+                max_batch=config.сonfig.VOTE_BUFFER_MAX_BATCH
+            )
+            self.vote_buffer.start()
         print("🟢 Бот запущен и начал логирование...")
-        asyncio.create_task(self.update_polls())
+        if self.invalidation_bus:
+            await self.invalidation_bus.start(
+                self.pool,
+                user=self.DB_USER,
+                password=self.DB_PASSWORD,
+                database=self.DB_NAME,
+                host=self.DB_HOST,
+                port=self.DB_PORT)
+        await self.load_poll_deadlines()
+        self.expiry_scheduler.start()
+        await self.load_live_results()
+        self.live_results.start()
+        if config.сonfig.SEND_QUEUE_ENABLED:
+            self.send_queue = sendqueue(
+                rate=config.сonfig.SEND_RATE,
+                chat_rate=config.сonfig.SEND_CHAT_RATE,
+                chat_burst=config.сonfig.SEND_CHAT_BURST,
+                group_rate=config.сonfig.SEND_GROUP_PER_MINUTE / 60,
+                max_retries=config.сonfig.SEND_MAX_RETRIES
+            )
+            self.bot.session.middleware(SendQueueMiddleware(self.send_queue))
+        if config.сonfig.METRICS_ENABLED:
+            self.bot.session.middleware(metrics.TelegramMetricsMiddleware())
+            metrics.track_pool(self.pool)
+            if self.replica:
+                metrics.track_replica(self.replica)
+            self.metrics_runner = await metrics.start_server(config.сonfig.METRICS_HOST, self.metrics_port)
+            print(f"📈 Метрики доступны на {config.сonfig.METRICS_HOST}:{self.metrics_port}/metrics")
+
+    async def shutdown(self):
+        """Останавливает фоновые службы и закрывает пул БД."""
+        if self.metrics_runner:
+            await self.metrics_runner.cleanup()
+        await self.expiry_scheduler.stop()
+        await self.live_results.stop()
+        if self.replica:
+            await self.replica.stop()
+        if self.send_queue:
+            await self.send_queue.close()
+        if self.invalidation_bus:
+            await self.invalidation_bus.close()
+        if self.vote_buffer:
+            await self.vote_buffer.close()  # Дописываем оставшиеся в буфере голоса
+        await self.close_db()
+        logger.stop()  # Дописываем очередь лога
+
+    async def run(self): 
+        await self.startup()
         try:
-            await self.dp.start_polling(self.bot)
+            if config.сonfig.BOT_MODE == "webhook":
+                await self.run_webhook()
+            else:
+                await self.dp.start_polling(self.bot)
         finally:
-            await self.close_db()
\ No newline at end of file
+            await self.shutdown()
+
+    async def run_webhook(self):
+        """Принимает обновления через вебхук на встроенном aiohttp-сервере."""
+        def register(app):
+            # Обновление подтверждается ответом 200 сразу, а обрабатывается в фоновой задаче
+            SimpleRequestHandler(
+                dispatcher=self.dp,
+                bot=self.bot,
+                secret_token=config.сonfig.WEBHOOK_SECRET,
+                handle_in_background=True
+            ).register(app, path=config.сonfig.WEBHOOK_PATH)
+            setup_application(app, self.dp, bot=self.bot)
+
+        await webhook.serve(self.bot, register, self.dp.resolve_used_update_types())
\ No newline at end of file
@@ -0,0 +1,52 @@
+import time
+from collections import OrderedDict
+
+
+class lrucache:
+    """Ограниченный по размеру LRU-кэш с временем жизни записей (TTL)."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]  # Запись устарела
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)  # Вытесняем самую старую запись
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def evict_expired(self):
+        """Удаляет устаревшие записи с начала очереди (самые давние по записи)."""
+        now = time.monotonic()
+        while self._data:
+            key, (expires_at, value) = next(iter(self._data.items()))
+            if expires_at >= now:
+                break
+            del self._data[key]
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._data)
@@ -12,4 +12,132 @@ class сonfig:
     ]
 
     POLL_ACTIVE = "active"
-    POLL_CLOSED = "closed"
\ No newline at end of file
+    POLL_CLOSED = "closed"
+
+    # Исходы попытки проголосовать
+    VOTE_ACCEPTED = "accepted"
+    VOTE_ALREADY_VOTED = "already_voted"
+    VOTE_POLL_CLOSED = "poll_closed"
+    VOTE_NO_ACCESS = "no_access"
+    VOTE_INVALID_OPTION = "invalid_option"
+
+    # Пул соединений с БД: размер, ожидание свободного соединения (сек), кэш подготовленных
+    # запросов asyncpg на соединение (0 — за pgbouncer в режиме transaction) и время жизни
+    # простаивающего соединения (сек)
+    DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+    DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+    DB_ACQUIRE_TIMEOUT = float(os.getenv("DB_ACQUIRE_TIMEOUT", "10"))
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+    DB_MAX_INACTIVE_CONNECTION_LIFETIME = float(os.getenv("DB_MAX_INACTIVE_CONNECTION_LIFETIME", "300"))
+
+    # Реплика для чтения (streaming replication): списки голосований, статистика и
+    # пользователи читаются с неё, пока она отстаёт не больше DB_REPLICA_MAX_LAG секунд.
+    # Пустой DB_REPLICA_HOST — все запросы идут в primary
+    DB_REPLICA_HOST = os.getenv("DB_REPLICA_HOST", "")
+    DB_REPLICA_PORT = int(os.getenv("DB_REPLICA_PORT", os.getenv("DB_PORT") or "5432"))
+    DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))
+    DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "1"))
+    DB_REPLICA_TIMEOUT = float(os.getenv("DB_REPLICA_TIMEOUT", "2"))
+
+    # Кэш голосований и вариантов ответа в памяти процесса
+    POLL_CACHE_SIZE = int(os.getenv("POLL_CACHE_SIZE", "1024"))
+    POLL_CACHE_TTL = float(os.getenv("POLL_CACHE_TTL", "60"))
+
+    # Кэш пользователей, уже сохранённых в БД (telegram_id -> username)
+    KNOWN_USERS_CACHE_SIZE = int(os.getenv("KNOWN_USERS_CACHE_SIZE", "10000"))
+    KNOWN_USERS_CACHE_TTL = float(os.getenv("KNOWN_USERS_CACHE_TTL", "3600"))
+
+    # Количество шардов счётчика голосов на один вариант ответа
+    VOTE_COUNTER_SHARDS = int(os.getenv("VOTE_COUNTER_SHARDS", "8"))
+
+    # Сверка счётчиков голосов с таблицей votes при запуске (читает все голоса,
+    # поэтому выключена; включается разово для обслуживания)
+    VOTE_COUNTERS_RECONCILE_ON_START = os.getenv("VOTE_COUNTERS_RECONCILE_ON_START", "false").lower() in ("1", "true", "yes")
+
+    # Количество голосований на одной странице статистики
+    STATS_PAGE_SIZE = int(os.getenv("STATS_PAGE_SIZE", "5"))
+
+    # Количество голосований на одной странице кнопок «Проголосовать»
+    VOTE_POLLS_PAGE_SIZE = int(os.getenv("VOTE_POLLS_PAGE_SIZE", "10"))
+
+    # Количество пользователей на одной странице списка пользователей
+    USERS_PAGE_SIZE = int(os.getenv("USERS_PAGE_SIZE", "10"))
+
+    # Отложенная запись голосов пачками: интервал сброса (мс) и максимальный размер пачки
+    VOTE_BUFFER_ENABLED = os.getenv("VOTE_BUFFER_ENABLED", "false").lower() in ("1", "true", "yes")
+    VOTE_BUFFER_FLUSH_MS = int(os.getenv("VOTE_BUFFER_FLUSH_MS", "50"))
+    VOTE_BUFFER_MAX_BATCH = int(os.getenv("VOTE_BUFFER_MAX_BATCH", "500"))
+
+    # Шина инвалидации кэшей между экземплярами бота (Postgres LISTEN/NOTIFY)
+    INVALIDATION_ENABLED = os.getenv("INVALIDATION_ENABLED", "true").lower() in ("1", "true", "yes")
+    INVALIDATION_CHANNEL = os.getenv("INVALIDATION_CHANNEL", "voting_bot_events")
+
+    # События жизненного цикла голосований
+    POLL_EVENT_CREATED = "created"
+    POLL_EVENT_ENDED = "ended"
+    POLL_EVENT_DELETED = "deleted"
+    POLL_EVENT_PARTICIPANTS = "participants"
+    POLL_EVENT_LIVE = "live"
+    POLL_EVENT_VOTED = "voted"  # Голоса для владельца живого сообщения
+
+    # Живые результаты: сообщение перерисовывается не чаще раза в LIVE_RESULTS_INTERVAL секунд
+    LIVE_RESULTS_INTERVAL = float(os.getenv("LIVE_RESULTS_INTERVAL", "5"))
+
+    # Режим получения обновлений: "polling" (по умолчанию) или "webhook"
+    BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Публичный адрес; если задан, вебхук регистрируется при запуске
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+    WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+
+    # Хранилище FSM: "postgres" (по умолчанию, переживает перезапуск) или "memory"
+    FSM_STORAGE = os.getenv("FSM_STORAGE", "postgres").lower()
+    FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "1024"))
+    FSM_CACHE_TTL = float(os.getenv("FSM_CACHE_TTL", "5"))
+
+    # Количество процессов-воркеров; при значении больше 1 обновления распределяются по ID пользователя
+    BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+    SHARD_QUEUE_SIZE = int(os.getenv("SHARD_QUEUE_SIZE", "1000"))
+
+    # Логирование: уровень, доля записываемых событий ("message=0.1,vote=1"), файл с ротацией
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_SAMPLING = {
+        event.strip(): float(rate)
+        for event, rate in (item.split("=") for item in os.getenv("LOG_SAMPLING", "").split(",") if item.strip())
+    }
+    LOG_STDOUT = os.getenv("LOG_STDOUT", "true").lower() in ("1", "true", "yes")
+    LOG_FILE = os.getenv("LOG_FILE")
+    LOG_FILE_MAX_BYTES = int(os.getenv("LOG_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+    LOG_FILE_BACKUPS = int(os.getenv("LOG_FILE_BACKUPS", "5"))
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+    # Метрики в формате Prometheus на http://METRICS_HOST:METRICS_PORT/metrics
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() in ("1", "true", "yes")
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+    # Ограничение частоты запросов: общий лимит на пользователя (запросов в секунду и запас)
+    # и отдельные лимиты для тяжёлых обработчиков в формате "обработчик=rate/burst"
+    THROTTLE_ENABLED = os.getenv("THROTTLE_ENABLED", "true").lower() in ("1", "true", "yes")
+    THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", "1"))
+    THROTTLE_BURST = int(os.getenv("THROTTLE_BURST", "5"))
+    THROTTLE_LIMITS = {
+        name.strip(): (float(limit.split("/")[0]), int(limit.split("/")[1]))
+        for name, limit in (
+            item.split("=") for item in os.getenv(
+                "THROTTLE_LIMITS",
+                "handle_statistika=0.2/2,handle_statistika_page=1/3,handle_show_users=0.1/1"
+            ).split(",") if item.strip()
+        )
+    }
+    THROTTLE_MAX_USERS = int(os.getenv("THROTTLE_MAX_USERS", "10000"))
+
+    # Очередь исходящих сообщений: общий лимит бота (сообщений в секунду), лимит на личный чат
+    # (в секунду и запас), лимит на группу (в минуту) и число повторов после ответа 429
+    SEND_QUEUE_ENABLED = os.getenv("SEND_QUEUE_ENABLED", "true").lower() in ("1", "true", "yes")
+    SEND_RATE = float(os.getenv("SEND_RATE", "30"))
+    SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+    SEND_CHAT_BURST = int(os.getenv("SEND_CHAT_BURST", "3"))
+    SEND_GROUP_PER_MINUTE = float(os.getenv("SEND_GROUP_PER_MINUTE", "20"))
+    SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
\ No newline at end of file
@@ -0,0 +1,191 @@
+"""Проверка планов запросов бота.
+
+Создаёт во временной схеме копию таблиц с индексами, заполняет её тестовыми
+данными и через EXPLAIN проверяет, что каждый запрос использует нужный индекс.
+Все изменения откатываются, рабочие таблицы не затрагиваются.
+
+Запуск: python explain_check.py (параметры подключения берутся из .env)
+"""
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime
+
+import asyncpg
+from dotenv import load_dotenv
+
+import repository
+
+load_dotenv()
+
+SCHEMA = "explain_check"
+TABLES = ["users", "polls", "poll_options", "poll_participants", "votes", "vote_counters"]
+
+SEED = [
+    """
+    INSERT INTO users (id, telegram_id, username)
+    SELECT g, g, 'user' || g FROM generate_series(1, 20000) g
+    """,
+    """
+    INSERT INTO polls (id, title, creator_id, end_time, is_active, is_private)
+    SELECT
+        g,
+        'poll ' || g,
+        g % 20000 + 1,
+        NOW() + ((g % 200) - 100) * INTERVAL '1 hour',
+        g % 100 = 0,
+        g % 10 = 0
+    FROM generate_series(1, 50000) g
+    """,
+    """
+    INSERT INTO poll_options (id, poll_id, option_text)
+    SELECT g, (g - 1) / 3 + 1, 'option ' || g FROM generate_series(1, 150000) g
+    """,
+    """
+    INSERT INTO poll_participants (poll_id, user_id)
+    SELECT DISTINCT g % 50000 + 1, (g * 7919) % 20000 + 1 FROM generate_series(1, 200000) g
+    """,
+    """
+    INSERT INTO votes (id, poll_id, user_id, option_id)
+    SELECT g, p, u, (p - 1) * 3 + u % 3 + 1
+    FROM (
+        SELECT g, g % 50000 + 1 AS p, (g / 50000) + 1 AS u FROM generate_series(1, 500000) g
+    ) s
+    """,
+    """
+    INSERT INTO vote_counters (poll_id, option_id, shard, votes_count)
+    SELECT poll_id, option_id, 0, COUNT(*) FROM votes GROUP BY poll_id, option_id
+    """,
+]
+
+# Исходы голосов для submit_votes: значения не влияют на план
+VOTE_OUTCOMES = ["closed", "no_access", "already_voted", "invalid_option", "accepted"]
+
+# (описание, запрос, параметры, индексы, которые обязаны встретиться в плане).
+# Проверяются те же тексты запросов, что выполняет бот
+QUERIES = [
+    (
+        "fetch_active_polls",
+        repository.QUERIES["active_polls_for_user"],
+        [42],
+        ["ix_polls_is_active_end_time", "ix_poll_participants_user_id"],
+    ),
+    (
+        "vote polls page",
+        repository.QUERIES["vote_polls_page_next"],
+        [42, 0, 11],
+        ["ix_polls_is_active_end_time", "ix_poll_participants_user_id"],
+    ),
+    (
+        "close_expired_polls",
+        repository.QUERIES["close_expired_polls"],
+        [datetime.now()],
+        ["ix_polls_is_active_end_time"],
+    ),
+    (
+        "fetch_active_priv_polls",
+        repository.QUERIES["active_private_polls"],
+        [42],
+        ["ix_polls_creator_id"],
+    ),
+    (
+        "statistics page next",
+        repository.QUERIES["statistics_page_next"],
+        [42, 0, 11],
+        ["ix_poll_participants_user_id", "ix_poll_options_poll_id", "ix_vote_counters_poll_id"],
+    ),
+    (
+        "statistics page prev",
+        repository.QUERIES["statistics_page_prev"],
+        [42, 25000, 11],
+        ["ix_poll_participants_user_id", "ix_poll_options_poll_id", "ix_vote_counters_poll_id"],
+    ),
+    (
+        "poll_stats",
+        repository.QUERIES["poll_stats"],
+        [42],
+        ["polls_pkey", "ix_poll_options_poll_id", "ix_vote_counters_poll_id"],
+    ),
+    (
+        "submit_votes",
+        repository.QUERIES["submit_votes"],
+        [[100, 200], [42, 43], ["user42", "user43"], [300, 600], 8, *VOTE_OUTCOMES],
+        ["polls_pkey", "poll_participants_pkey", "votes_poll_id_user_id_key", "ix_poll_options_poll_id"],
+    ),
+    (
+        # Запроса нет в repository: этот оператор выполняет сам Postgres, когда
+        # каскадное удаление poll_options удаляет голоса варианта
+        "votes by option",
+        "DELETE FROM votes WHERE option_id = $1",
+        [42],
+        ["ix_votes_option_id"],
+    ),
+    (
+        "users page search",
+        repository.QUERIES["users_page_next"],
+        ["user12", "user12\U0010ffff", "user123", 123, 11],
+        ["ix_users_username_key"],
+    ),
+]
+
+
+def used_indexes(plan):
+    """Собирает имена индексов из всех узлов плана."""
+    found = set()
+    if "Index Name" in plan:
+        found.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        found |= used_indexes(child)
+    return found
+
+
+async def main():
+    conn = await asyncpg.connect(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"))
+
+    failed = 0
+    try:
+        tr = conn.transaction()
+        await tr.start()
+        try:
+            await conn.execute(f"CREATE SCHEMA {SCHEMA}")
+            for table in TABLES:
+                await conn.execute(f"CREATE TABLE {SCHEMA}.{table} (LIKE public.{table} INCLUDING DEFAULTS)")
+
+            # Индексы переносим с исходными именами, чтобы сверять их с планом
+            indexes = await conn.fetch(
+                "SELECT indexdef FROM pg_indexes WHERE schemaname = 'public' AND tablename = ANY($1::text[])",
+                TABLES
+            )
+            for index in indexes:
+                await conn.execute(index['indexdef'].replace(" ON public.", f" ON {SCHEMA}."))
+            await conn.execute(f"SET LOCAL search_path TO {SCHEMA}")
+
+            for statement in SEED:
+                await conn.execute(statement)
+            for table in TABLES:
+                await conn.execute(f"ANALYZE {SCHEMA}.{table}")
+
+            for name, query, params, expected in QUERIES:
+                plan = json.loads(await conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *params))[0]["Plan"]
+                missing = [index for index in expected if index not in used_indexes(plan)]
+                if missing:
+                    failed += 1
+                    print(f"❌ {name}: в плане нет индексов {', '.join(missing)}")
+                else:
+                    print(f"✅ {name}: {', '.join(expected)}")
+        finally:
+            await tr.rollback()
+    finally:
+        await conn.close()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
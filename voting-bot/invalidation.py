@@ -0,0 +1,101 @@
+import asyncio
+import json
+import uuid
+
+import asyncpg
+
+
+class invalidationbus:
+    """Шина инвалидации локальных кэшей между экземплярами бота.
+
+    Работает на Postgres LISTEN/NOTIFY: изменения жизненного цикла голосований
+    публикуются компактными JSON-событиями, а каждый экземпляр слушает канал на
+    отдельном соединении и обновляет свои кэши. Свои же события игнорируются —
+    локально они уже применены.
+
+    На том же соединении экземпляр берёт advisory-блокировки (claim): ими
+    делится работа между экземплярами, а при обрыве соединения они снимаются
+    сами и достаются другим экземплярам.
+    """
+
+    def __init__(self, channel, on_event, on_reconnect=None):
+        self.channel = channel
+        self.on_event = on_event  # (event, poll_ids, data) -> None
+        self.on_reconnect = on_reconnect  # async () -> None, события за время обрыва потеряны
+        self.instance_id = uuid.uuid4().hex[:12]
+
+        self._pool = None
+        self._connect_kwargs = {}
+        self._conn = None
+        self._closing = False
+        self._reconnect_task = None
+
+    async def start(self, pool, **connect_kwargs):
+        self._pool = pool
+        self._connect_kwargs = connect_kwargs
+        await self._connect()
+
+    async def close(self):
+        self._closing = True
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+        if self._conn and not self._conn.is_closed():
+            await self._conn.close()
+
+    async def publish(self, event, poll_ids, **data):
+        payload = json.dumps(
+            {"e": event, "ids": list(poll_ids), "o": self.instance_id, **data},
+            separators=(",", ":")
+        )
+        async with self._pool.acquire() as conn:
+            await conn.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+
+    async def claim(self, scope, keys):
+        """Берёт свободные блокировки ключей scope и возвращает ключи, которые достались этому экземпляру."""
+        rows = await self._conn.fetch(
+            "SELECT key FROM unnest($2::bigint[]) AS key WHERE pg_try_advisory_lock(hashtext($1), hashint8(key))",
+            scope, list(keys)
+        )
+        return [row['key'] for row in rows]
+
+    async def release(self, scope, keys):
+        await self._conn.execute(
+            "SELECT pg_advisory_unlock(hashtext($1), hashint8(key)) FROM unnest($2::bigint[]) AS key",
+            scope, list(keys)
+        )
+
+    async def _connect(self):
+        self._conn = await asyncpg.connect(**self._connect_kwargs)
+        await self._conn.add_listener(self.channel, self._on_notify)
+        self._conn.add_termination_listener(self._on_terminate)
+
+    def _on_notify(self, conn, pid, channel, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            print(f"Некорректное событие инвалидации: {payload}")
+            return
+
+        if event.get("o") == self.instance_id:
+            return
+        self.on_event(event.get("e"), event.get("ids", []), event)
+
+    def _on_terminate(self, conn):
+        if not self._closing:
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = 1
+        while not self._closing:
+            try:
+                await self._connect()
+            except Exception as e:
+                print(f"Не удалось переподключить шину инвалидации: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+                continue
+
+            print("Шина инвалидации переподключена.")
+            if self.on_reconnect:
+                await self.on_reconnect()
+            return
@@ -1,4 +1,34 @@
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+
+
+class StatsPage(CallbackData, prefix="stats"):
+    direction: str  # "next" или "prev"
+    cursor: int  # ID голосования, от которого листаем
+
+
+class UserPage(CallbackData, prefix="users"):
+    direction: str  # "next" или "prev"
+    key: str  # Ключ сортировки (username в нижнем регистре) пользователя, от которого листаем
+    user_id: int
+
+
+class UserPick(CallbackData, prefix="pick"):
+    user_id: int  # 0 — завершить выбор
+
+
+class VotePoll(CallbackData, prefix="vp"):
+    poll_id: int
+
+
+class VotePollPage(CallbackData, prefix="vpp"):
+    direction: str  # "next" или "prev"
+    cursor: int  # ID голосования, от которого листаем
+
+
+class Vote(CallbackData, prefix="v"):
+    poll_id: int
+    option_id: int
 
 
 class keyboard:
@@ -26,19 +56,43 @@ class keyboard:
         )
 
     @staticmethod
-    def get_poll_options_keyboard(options: list):
-        return ReplyKeyboardMarkup(
-            keyboard=[
-                         [KeyboardButton(text=option)] for option in options
-                     ] + [[KeyboardButton(text="Отмена")]],
-            resize_keyboard=True
-        )
+    def get_vote_polls_keyboard(polls: list, has_prev: bool = False, has_next: bool = False):
+        rows = [
+            [InlineKeyboardButton(text=f"#{poll.id} {poll.title}", callback_data=VotePoll(poll_id=poll.id).pack())]
+            for poll in polls
+        ]
+
+        buttons = []
+        if has_prev:
+            buttons.append(InlineKeyboardButton(
+                text="⬅️ Назад",
+                callback_data=VotePollPage(direction="prev", cursor=polls[0].id).pack()
+            ))
+        if has_next:
+            buttons.append(InlineKeyboardButton(
+                text="Далее ➡️",
+                callback_data=VotePollPage(direction="next", cursor=polls[-1].id).pack()
+            ))
+        if buttons:
+            rows.append(buttons)
+        return InlineKeyboardMarkup(inline_keyboard=rows)
+
+    @staticmethod
+    def get_vote_options_keyboard(poll_id: int, options: list):
+        return InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(
+                text=option.option_text,
+                callback_data=Vote(poll_id=poll_id, option_id=option.id).pack()
+            )]
+            for option in options
+        ])
 
     @staticmethod
     def get_confirm_keyboard():
         return ReplyKeyboardMarkup(
             keyboard=[
                 [KeyboardButton(text="Удалить"), KeyboardButton(text="Завершить")],
+                [KeyboardButton(text="Результаты онлайн")],
                 [KeyboardButton(text="Отмена")]
             ],
             resize_keyboard=True
@@ -60,4 +114,54 @@ class keyboard:
                 [KeyboardButton(text="Числовой"), KeyboardButton(text="Строчный")]
             ],
             resize_keyboard=True
-        )
\ No newline at end of file
+        )
+
+    @staticmethod
+    def get_stats_page_keyboard(first_id: int, last_id: int, has_prev: bool, has_next: bool):
+        buttons = []
+        if has_prev:
+            buttons.append(InlineKeyboardButton(
+                text="⬅️ Назад",
+                callback_data=StatsPage(direction="prev", cursor=first_id).pack()
+            ))
+        if has_next:
+            buttons.append(InlineKeyboardButton(
+                text="Далее ➡️",
+                callback_data=StatsPage(direction="next", cursor=last_id).pack()
+            ))
+        if not buttons:
+            return None
+        return InlineKeyboardMarkup(inline_keyboard=[buttons])
+
+    @staticmethod
+    def get_users_page_keyboard(users: list, selected: set, has_prev: bool, has_next: bool, selectable: bool):
+        rows = []
+        if selectable:
+            for user in users:
+                mark = "✅ " if user.telegram_id in selected else ""
+                rows.append([InlineKeyboardButton(
+                    text=f"{mark}{user.username or 'Без имени'} ({user.telegram_id})",
+                    callback_data=UserPick(user_id=user.telegram_id).pack()
+                )])
+
+        buttons = []
+        if has_prev:
+            first = users[0]
+            buttons.append(InlineKeyboardButton(
+                text="⬅️ Назад",
+                callback_data=UserPage(direction="prev", key=first.name_key, user_id=first.telegram_id).pack()
+            ))
+        if has_next:
+            last = users[-1]
+            buttons.append(InlineKeyboardButton(
+                text="Далее ➡️",
+                callback_data=UserPage(direction="next", key=last.name_key, user_id=last.telegram_id).pack()
+            ))
+        if buttons:
+            rows.append(buttons)
+
+        if selectable:
+            rows.append([InlineKeyboardButton(text="Готово", callback_data=UserPick(user_id=0).pack())])
+        if not rows:
+            return None
+        return InlineKeyboardMarkup(inline_keyboard=rows)
\ No newline at end of file
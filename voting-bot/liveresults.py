@@ -0,0 +1,174 @@
+import asyncio
+
+from aiogram.exceptions import TelegramBadRequest
+
+from logger import logger
+
+
+class liveresults:
+    """Сообщения с результатами голосований, которые обновляются по мере голосования.
+
+    Принятый голос только помечает голосование как изменившееся. Фоновая задача
+    перерисовывает помеченные голосования не чаще раза в interval секунд и правит
+    сообщение, только если изменился подсчёт голосов; одинаковый текст повторно
+    не отправляется.
+
+    Если экземпляров бота несколько, сообщение правит только владелец
+    голосования: экземпляр, которому claim_func выдал его (advisory-блокировка
+    на соединении шины инвалидации). Голосования, которыми владеет другой
+    экземпляр, раз в interval секунд одной пачкой передаются ему через
+    delegate_func, и владелец помечает их через notify_remote.
+    """
+
+    def __init__(self, fetch_func, format_func, edit_func, interval: float = 5,
+                 claim_func=None, release_func=None, delegate_func=None):
+        self.fetch_func = fetch_func  # async (poll_id) -> models.Tally или None
+        self.format_func = format_func  # (Tally) -> текст сообщения
+        self.edit_func = edit_func  # async (chat_id, message_id, text) -> None
+        self.interval = interval
+        self.claim_func = claim_func  # async (poll_ids) -> poll_ids, которые стали своими; None — всё своё
+        self.release_func = release_func  # async (poll_ids) -> None
+        self.delegate_func = delegate_func  # async (poll_ids) -> None, оповещает владельцев
+
+        self._messages = {}  # poll_id -> (chat_id, message_id)
+        self._tallies = {}  # poll_id -> последний отрисованный подсчёт
+        self._texts = {}  # poll_id -> последний отправленный текст
+        self._owned = set()  # Голосования, которые правит этот экземпляр
+        self._released = set()  # Забытые свои голосования, блокировки которых нужно отпустить
+        self._dirty = set()
+        self._remote = set()  # Голоса других экземпляров: правим, только если голосование своё
+        self._ended = set()  # Завершённые голосования: итог дорисовывает владелец, остальные забывают
+        self._has_dirty = asyncio.Event()
+        self._task = None
+
+    @staticmethod
+    def tally(stats):
+        return stats.is_active, stats.options
+
+    def track(self, poll_id, chat_id, message_id, stats=None, text=None):
+        self._messages[poll_id] = (chat_id, message_id)
+        self._tallies.pop(poll_id, None)
+        self._texts.pop(poll_id, None)
+        if stats is not None:
+            self._tallies[poll_id] = self.tally(stats)
+            self._texts[poll_id] = text
+
+    def forget(self, poll_id):
+        self._messages.pop(poll_id, None)
+        self._tallies.pop(poll_id, None)
+        self._texts.pop(poll_id, None)
+        self._dirty.discard(poll_id)
+        self._remote.discard(poll_id)
+        self._ended.discard(poll_id)
+        if poll_id in self._owned:
+            self._owned.discard(poll_id)
+            self._released.add(poll_id)
+            self._has_dirty.set()  # Блокировку отпустит фоновая задача
+
+    def disown(self):
+        """Забывает владение всеми голосованиями: блокировки пропали вместе с соединением."""
+        self._owned.clear()
+        self._released.clear()
+
+    def notify(self, poll_id):
+        """Помечает голосование как изменившееся, если у него есть живое сообщение."""
+        if poll_id in self._messages:
+            self._dirty.add(poll_id)
+            self._has_dirty.set()
+
+    def notify_remote(self, poll_id):
+        """Голос принят другим экземпляром: голосование перерисуется, если оно своё или ничьё."""
+        if poll_id in self._messages:
+            self._remote.add(poll_id)
+            self._has_dirty.set()
+
+    def finish(self, poll_id):
+        """Голосование завершено: владелец перерисует итог, остальные экземпляры забудут сообщение."""
+        if poll_id in self._messages:
+            self._ended.add(poll_id)
+            self._has_dirty.set()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            await self._has_dirty.wait()
+            self._has_dirty.clear()
+            dirty, self._dirty = self._dirty, set()
+            remote, self._remote = self._remote, set()
+            ended, self._ended = self._ended, set()
+            try:
+                dirty = await self._own(dirty, remote, ended)
+            except Exception as e:
+                logger.log("ERROR", "live_results_claim_failed", error=str(e))
+                self._dirty |= dirty | remote | ended  # Повторим в следующем цикле
+                dirty = set()
+            for poll_id in dirty:
+                try:
+                    await self._refresh(poll_id)
+                except Exception as e:
+                    logger.log("ERROR", "live_results_refresh_failed", poll_id=poll_id, error=str(e))
+            try:
+                await self._release()  # Голосования, завершённые при перерисовке
+            except Exception as e:
+                logger.log("ERROR", "live_results_release_failed", error=str(e))
+            await asyncio.sleep(self.interval)  # Голоса за это время соберутся в одну правку
+
+    async def _own(self, dirty, remote, ended):
+        """Возвращает помеченные голосования, которые правит этот экземпляр.
+
+        Ничьи голосования забираются себе; свои локальные голоса по чужим
+        голосованиям передаются владельцам. Чужие оповещения дальше не передаются,
+        а чужие завершённые голосования забываются.
+        """
+        marked = dirty | remote | ended
+        if self.claim_func is None:
+            return marked
+        await self._release()
+        unowned = marked - self._owned
+        if unowned:
+            self._owned |= set(await self.claim_func(unowned))
+        delegated = dirty - ended - self._owned
+        if delegated:
+            await self.delegate_func(delegated)
+        for poll_id in ended - self._owned:
+            self.forget(poll_id)
+        return marked & self._owned
+
+    async def _release(self):
+        if self._released:
+            released, self._released = self._released, set()
+            await self.release_func(released)
+
+    async def _refresh(self, poll_id):
+        stats = await self.fetch_func(poll_id)
+        if stats is None or poll_id not in self._messages:
+            self.forget(poll_id)  # Голосование удалено
+            return
+
+        tally = self.tally(stats)
+        if tally != self._tallies.get(poll_id):
+            text = self.format_func(stats)
+            if text != self._texts.get(poll_id):
+                chat_id, message_id = self._messages[poll_id]
+                try:
+                    await self.edit_func(chat_id, message_id, text)
+                except TelegramBadRequest as e:
+                    if "not modified" not in str(e):
+                        logger.log("WARNING", "live_results_message_unavailable", poll_id=poll_id, error=str(e))
+                        self.forget(poll_id)
+                        return
+                self._texts[poll_id] = text
+            self._tallies[poll_id] = tally
+
+        if not stats.is_active:
+            self.forget(poll_id)  # Итог завершённого голосования больше не меняется
@@ -0,0 +1,220 @@
+"""Нагрузочный тест бота через Dispatcher.
+
+Поднимает bothandler с настоящей БД (параметры подключения берутся из .env) и
+заглушкой вместо Telegram. N пользователей одновременно проходят сценарии
+«создать голосование», «проголосовать» и «статистика»: обновления собираются
+в формате Bot API и подаются в dp.feed_update, а ответы бота заглушка
+запоминает, чтобы нажимать кнопки из них. Выводит пропускную способность,
+задержки p50/p95/p99 по сценариям и число запросов к БД на обновление.
+
+Запуск: python load_test.py [--users 50] [--rounds 20] [--mix create=1,vote=6,stats=3]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from aiogram import Bot
+from aiogram.methods import EditMessageText, SendMessage
+from aiogram.types import InlineKeyboardMarkup, Update
+
+from bothandler import bothandler
+import config
+import metrics
+from shard_benchmark import StubSession
+
+
+class RecordingSession(StubSession):
+    """Заглушка Telegram, которая запоминает последнюю inline-клавиатуру в каждом чате."""
+
+    def __init__(self):
+        super().__init__()
+        self.markups = {}  # chat_id -> InlineKeyboardMarkup
+        self.requests = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests += 1
+        if isinstance(method, (SendMessage, EditMessageText)):
+            if isinstance(method.reply_markup, InlineKeyboardMarkup):
+                self.markups[method.chat_id] = method.reply_markup
+            else:
+                self.markups.pop(method.chat_id, None)
+        return await super().make_request(bot, method, timeout)
+
+
+class user:
+    """Имитация пользователя: собирает обновления и подаёт их в Dispatcher."""
+
+    def __init__(self, test, user_id):
+        self.test = test
+        self.user_id = user_id
+        self.sender = {"id": user_id, "is_bot": False, "first_name": "load", "username": f"load{user_id}"}
+        self.chat = {"id": user_id, "type": "private"}
+
+    async def feed(self, event, payload):
+        test = self.test
+        test.update_id += 1
+        payload["from"] = self.sender
+        update = Update.model_validate({"update_id": test.update_id, event: payload})
+
+        started = time.perf_counter()
+        await test.handler.dp.feed_update(test.handler.bot, update)
+        test.update_latencies.append(time.perf_counter() - started)
+
+    async def say(self, text):
+        await self.feed("message", {
+            "message_id": self.test.update_id,
+            "date": int(time.time()),
+            "chat": self.chat,
+            "text": text,
+        })
+
+    async def press(self, button):
+        """Нажимает inline-кнопку под последним сообщением бота."""
+        await self.feed("callback_query", {
+            "id": str(self.test.update_id),
+            "chat_instance": "load",
+            "data": button.callback_data,
+            "message": {"message_id": 1, "date": int(time.time()), "chat": self.chat, "text": "…"},
+        })
+
+    def buttons(self, prefix):
+        markup = self.test.session.markups.get(self.user_id)
+        if markup is None:
+            return []
+        return [
+            button for row in markup.inline_keyboard for button in row
+            if button.callback_data and button.callback_data.startswith(prefix)
+        ]
+
+    async def create(self):
+        for text in ("Создать голосование", "Публичное", "Строчный", f"Нагрузка {self.user_id}", "Да, Нет, Воздержался", "24"):
+            await self.say(text)
+
+    async def vote(self):
+        await self.say("Проголосовать")
+        polls = self.buttons("vp:")
+        if polls:
+            await self.press(random.choice(polls))
+        options = self.buttons("v:")
+        if options:
+            await self.press(random.choice(options))
+
+    async def stats(self):
+        await self.say("Статистика")
+
+
+class loadtest:
+    FLOWS = ("create", "vote", "stats")
+
+    def __init__(self, users, rounds, mix, polls, user_base):
+        self.users = [user(self, user_base + i) for i in range(users)]
+        self.rounds = rounds
+        self.mix = mix  # имя сценария -> вес
+        self.polls = polls
+        self.update_id = 0
+        self.update_latencies = []
+        self.flow_latencies = {name: [] for name in self.FLOWS}
+        self.handler = None
+        self.session = None
+
+    async def start(self):
+        # Нагрузку измеряем на самом боте: ограничение частоты и очередь исходящих
+        # сообщений выключены, метрики включены ради счётчика запросов к БД
+        config.сonfig.THROTTLE_ENABLED = False
+        config.сonfig.SEND_QUEUE_ENABLED = False
+        config.сonfig.METRICS_ENABLED = True
+        config.сonfig.LOG_STDOUT = False
+
+        self.handler = bothandler()
+        self.handler.metrics_port = 0  # Свободный порт: тест может работать рядом с ботом
+        self.session = RecordingSession()
+        self.handler.bot = Bot(token=self.handler.BOT_TOKEN, session=self.session)
+        await self.handler.startup()
+        await self.handler.dp.emit_startup(bot=self.handler.bot)
+
+        # Голосования, за которые будут голосовать, создаются до замера
+        for poll_creator in self.users[:self.polls]:
+            await poll_creator.create()
+        self.update_latencies.clear()
+
+    async def stop(self):
+        await self.handler.dp.emit_shutdown(bot=self.handler.bot)
+        await self.handler.shutdown()
+        await self.handler.bot.session.close()
+
+    async def run_user(self, simulated):
+        names = list(self.mix)
+        weights = list(self.mix.values())
+        for _ in range(self.rounds):
+            name = random.choices(names, weights)[0]
+            started = time.perf_counter()
+            await getattr(simulated, name)()
+            self.flow_latencies[name].append(time.perf_counter() - started)
+
+    async def run(self):
+        await self.start()
+        try:
+            queries = db_queries()
+            requests = self.session.requests
+            started = time.perf_counter()
+            await asyncio.gather(*(self.run_user(simulated) for simulated in self.users))
+            elapsed = time.perf_counter() - started
+            queries = db_queries() - queries
+            requests = self.session.requests - requests
+        finally:
+            await self.stop()
+        self.report(elapsed, queries, requests)
+
+    def report(self, elapsed, queries, requests):
+        updates = len(self.update_latencies)
+        flows = sum(len(latencies) for latencies in self.flow_latencies.values())
+        print(f"пользователей: {len(self.users)}  сценариев: {flows}  обновлений: {updates}  время: {elapsed:.2f} с")
+        print(f"обновлений/с: {updates / elapsed:8.0f}  сценариев/с: {flows / elapsed:8.0f}")
+        print(f"запросов к БД на обновление: {queries / updates:.2f}  вызовов Telegram API на обновление: {requests / updates:.2f}")
+        print()
+        print(f"{'сценарий':<10}{'кол-во':>8}{'в сек':>8}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}")
+        for name, latencies in (*self.flow_latencies.items(), ("update", self.update_latencies)):
+            if not latencies:
+                continue
+            p50, p95, p99 = (percentile(latencies, q) * 1000 for q in (50, 95, 99))
+            print(f"{name:<10}{len(latencies):>8}{len(latencies) / elapsed:>8.0f}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}")
+
+
+def db_queries():
+    """Число запросов к БД, замеренных метриками с начала работы процесса."""
+    return sum(sum(series[:-1]) for series in metrics.DB_QUERY_LATENCY.values.values())
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(","):
+        name, weight = item.split("=")
+        if name not in loadtest.FLOWS:
+            raise argparse.ArgumentTypeError(f"неизвестный сценарий: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=20, help="сценариев на пользователя")
+    parser.add_argument("--mix", type=parse_mix, default="create=1,vote=6,stats=3")
+    parser.add_argument("--polls", type=int, default=5, help="голосований, создаваемых до замера")
+    parser.add_argument("--user-base", type=int, default=None, help="ID первого пользователя (по умолчанию новый на каждый запуск)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    user_base = args.user_base or 2_000_000_000 + int(time.time()) % 1_000_000 * 1000
+    await loadtest(args.users, args.rounds, args.mix, args.polls, user_base).run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
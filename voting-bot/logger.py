@@ -1,40 +1,115 @@
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
 from datetime import datetime
+from logging.handlers import RotatingFileHandler
 from aiogram import types
+import config
+
+
 class logger:
+    """Структурированный лог в формате JSON lines.
+
+    Обработчик только кладёт событие в очередь; форматирование и запись в
+    stdout/файл выполняет фоновый поток. Если очередь переполнена, событие
+    отбрасывается, а число потерянных записей попадает в лог позже.
+    """
+
+    LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+    level = LEVELS.get(config.сonfig.LOG_LEVEL, 20)
+    sampling = config.сonfig.LOG_SAMPLING  # event -> доля записываемых событий
+
+    _queue = queue.Queue(config.сonfig.LOG_QUEUE_SIZE)
+    _sinks = []
+    _thread = None
+    _lock = threading.Lock()
+    _dropped = 0
+
+    @classmethod
+    def start(cls):
+        with cls._lock:
+            if cls._thread:
+                return
+            if config.сonfig.LOG_STDOUT:
+                cls._sinks.append(logging.StreamHandler(sys.stdout))
+            if config.сonfig.LOG_FILE:
+                cls._sinks.append(RotatingFileHandler(
+                    config.сonfig.LOG_FILE,
+                    maxBytes=config.сonfig.LOG_FILE_MAX_BYTES,
+                    backupCount=config.сonfig.LOG_FILE_BACKUPS,
+                    encoding="utf-8"
+                ))
+            cls._thread = threading.Thread(target=cls._run, name="logger", daemon=True)
+            cls._thread.start()
+
+    @classmethod
+    def stop(cls):
+        """Дописывает очередь и останавливает фоновый поток."""
+        with cls._lock:
+            thread, cls._thread = cls._thread, None
+        if thread:
+            cls._queue.put(None)
+            thread.join()
+            for sink in cls._sinks:
+                sink.close()
+            cls._sinks.clear()
+
+    @classmethod
+    def log(cls, level: str, event: str, **fields):
+        if cls.LEVELS[level] < cls.level:
+            return
+        rate = cls.sampling.get(event)
+        if rate is not None and random.random() >= rate:
+            return
+        if not cls._thread:
+            cls.start()
+        try:
+            cls._queue.put_nowait((time.time(), level, event, fields))
+        except queue.Full:
+            cls._dropped += 1
+
+    @classmethod
+    def _run(cls):
+        while True:
+            item = cls._queue.get()
+            if item is None:
+                return
+            if cls._dropped:
+                dropped, cls._dropped = cls._dropped, 0
+                cls._write((time.time(), "WARNING", "log_dropped", {"count": dropped}))
+            cls._write(item)
+
+    @classmethod
+    def _write(cls, item):
+        ts, level, event, fields = item
+        line = json.dumps(
+            {"ts": datetime.fromtimestamp(ts).isoformat(timespec="milliseconds"), "level": level, "event": event, **fields},
+            ensure_ascii=False,
+            default=str
+        )
+        record = logging.makeLogRecord({"msg": line, "levelno": cls.LEVELS[level], "levelname": level})
+        for sink in cls._sinks:
+            sink.handle(record)
+
     @staticmethod
     def log_message(message: types.Message):
-        time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        user_id = message.from_user.id
-        username = message.from_user.username or "Без username"
-        first_name = message.from_user.first_name or "Без имени"
-        text = message.text or "Нет текста (стикер/фото/другое)"
-
-        print(
-            f"[{time}] 🚀 Сообщение от: "
-            f"ID={user_id}, "
-            f"Username=@{username}, "
-            f"Имя={first_name}\n"
-            f"Текст: {text}\n"
-            f"────────────────────"
+        logger.log(
+            "INFO", "message",
+            user_id=message.from_user.id,
+            username=message.from_user.username,
+            first_name=message.from_user.first_name,
+            text=message.text
         )
 
     @staticmethod
     def log_vote(user_id: int, poll_id: int, option: str):
-        time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(
-            f"[{time}] ✅ Голосование: "
-            f"Пользователь ID={user_id} "
-            f"проголосовал в опросе ID={poll_id} "
-            f"за вариант '{option}'\n"
-            f"────────────────────"
-        )
+        logger.log("INFO", "vote", user_id=user_id, poll_id=poll_id, option=option)
 
     @staticmethod
     def log_vote_attempt(user_id: int, action: str):
-        time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(
-            f"[{time}] ⚠️ Попытка голосования: "
-            f"Пользователь ID={user_id} "
-            f"действие: {action}\n"
-            f"────────────────────"
-        )
\ No newline at end of file
+        logger.log("WARNING", "vote_attempt", user_id=user_id, action=action)
@@ -1,6 +1,12 @@
 import asyncio
 from bothandler import bothandler
+from shardrunner import shardrunner
+import config
 
 if __name__ == "__main__":
-    bot_handler = bothandler()
-    asyncio.run(bot_handler.run())
\ No newline at end of file
+    if config.сonfig.BOT_WORKERS > 1:
+        runner = shardrunner(config.сonfig.BOT_WORKERS, queue_size=config.сonfig.SHARD_QUEUE_SIZE)
+        asyncio.run(runner.run())
+    else:
+        bot_handler = bothandler()
+        asyncio.run(bot_handler.run())
\ No newline at end of file
@@ -0,0 +1,232 @@
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from functools import lru_cache
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiohttp import web
+
+from repository import QUERIES
+
+
+REGISTRY = []
+
+
+class counter:
+    """Монотонный счётчик с метками."""
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = defaultdict(float)
+        REGISTRY.append(self)
+
+    def inc(self, *labelvalues, value=1):
+        self.values[labelvalues] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labelvalues, value in self.values.items():
+            yield f"{self.name}{_labels(self.labels, labelvalues)} {value}"
+
+
+class gauge:
+    """Значение, которое вычисляется в момент сбора метрик."""
+
+    def __init__(self, name, help, labels=(), func=None):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.func = func  # () -> {labelvalues: value}
+        REGISTRY.append(self)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        for labelvalues, value in (self.func() if self.func else {}).items():
+            yield f"{self.name}{_labels(self.labels, labelvalues)} {value}"
+
+
+class histogram:
+    """Гистограмма длительностей в секундах."""
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}  # labelvalues -> [счётчики корзин..., +Inf, сумма]
+        REGISTRY.append(self)
+
+    def observe(self, value, *labelvalues):
+        series = self.values.get(labelvalues)
+        if series is None:
+            series = self.values[labelvalues] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labelvalues, series in self.values.items():
+            total = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                total += count
+                le = _labels(self.labels + ("le",), labelvalues + (bound,))
+                yield f"{self.name}_bucket{le} {total}"
+            yield f"{self.name}_sum{_labels(self.labels, labelvalues)} {series[-1]}"
+            yield f"{self.name}_count{_labels(self.labels, labelvalues)} {total}"
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render():
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+UPDATES = counter("bot_updates_total", "Обработанные обновления Telegram", ("type",))
+UPDATE_ERRORS = counter("bot_update_errors_total", "Обновления, обработка которых завершилась исключением", ("type",))
+HANDLER_LATENCY = histogram("bot_handler_duration_seconds", "Время работы обработчиков", ("handler",))
+DB_ACQUIRE_WAIT = histogram("db_pool_acquire_wait_seconds", "Ожидание соединения в pool.acquire()")
+DB_QUERY_LATENCY = histogram("db_query_duration_seconds", "Время выполнения запросов к БД", ("query",))
+DB_QUERY_ERRORS = counter("db_query_errors_total", "Запросы к БД, завершившиеся ошибкой", ("query",))
+TELEGRAM_API_LATENCY = histogram("telegram_api_duration_seconds", "Время вызовов Telegram Bot API", ("method",))
+TELEGRAM_API_ERRORS = counter("telegram_api_errors_total", "Вызовы Telegram Bot API, завершившиеся ошибкой", ("method",))
+
+
+def track_pool(pool):
+    """Публикует размер пула соединений как gauge."""
+    gauge(
+        "db_pool_connections", "Соединения пула asyncpg", ("state",),
+        lambda: {
+            ("total",): pool.get_size(),
+            ("idle",): pool.get_idle_size(),
+            ("max",): pool.get_max_size(),
+        }
+    )
+
+
+def track_replica(replica):
+    """Публикует отставание реплики как gauge; -1 — реплика недоступна."""
+    gauge(
+        "db_replica_lag_seconds", "Отставание реплики от primary, -1 — реплика недоступна", (),
+        lambda: {(): -1 if replica.lag is None else replica.lag}
+    )
+
+
+# Текст запроса репозитория -> его имя в QUERIES
+_QUERY_NAMES = {query: name for name, query in QUERIES.items()}
+
+
+@lru_cache(maxsize=512)
+def query_label(query):
+    """Метка запроса: имя в QUERIES; прочие запросы — текст в одну строку, не длиннее 80 символов."""
+    name = _QUERY_NAMES.get(query)
+    if name is not None:
+        return name
+    return " ".join(query.split())[:80]
+
+
+def log_query(record):
+    label = query_label(record.query)
+    DB_QUERY_LATENCY.observe(record.elapsed, label)
+    if record.exception is not None:
+        DB_QUERY_ERRORS.inc(label)
+
+
+async def setup_connection(conn):
+    """init-колбэк пула: замеряет время каждого запроса соединения."""
+    conn.add_query_logger(log_query)
+
+
+class instrumentedpool:
+    """Обёртка пула asyncpg, замеряющая ожидание в acquire()."""
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    def acquire(self, *, timeout=None):
+        return _timedacquire(self._pool.acquire(timeout=timeout))
+
+
+class _timedacquire:
+    def __init__(self, context):
+        self._context = context
+
+    async def __aenter__(self):
+        started = time.perf_counter()
+        try:
+            return await self._context.__aenter__()
+        finally:
+            DB_ACQUIRE_WAIT.observe(time.perf_counter() - started)
+
+    async def __aexit__(self, *exc):
+        return await self._context.__aexit__(*exc)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Считает обновления и ошибки их обработки."""
+
+    async def __call__(self, handler, event, data):
+        UPDATES.inc(event.event_type)
+        try:
+            return await handler(event, data)
+        except Exception:
+            UPDATE_ERRORS.inc(event.event_type)
+            raise
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Замеряет время работы обработчика сообщения или callback-запроса."""
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - started, data['handler'].callback.__name__)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Замеряет время вызовов Telegram Bot API."""
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            TELEGRAM_API_ERRORS.inc(name)
+            raise
+        finally:
+            TELEGRAM_API_LATENCY.observe(time.perf_counter() - started, name)
+
+
+async def start_server(host, port):
+    """Запускает HTTP-сервер с метриками в формате Prometheus на /metrics."""
+    async def handle(request):
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,275 @@
+"""Микробенчмарки горячих путей бота без Postgres и Telegram.
+
+Замеряет агрегацию и форматирование статистики (handle_statistika), построение
+клавиатур, разбиение длинных сообщений, логирование сообщений и загрузку
+активных голосований. Пул asyncpg и types.Message подменяются заглушками в
+памяти, поэтому результаты воспроизводимы на ноутбуке. Результаты сохраняются
+в JSON; с --compare они сравниваются с прошлым запуском (например, на другом
+коммите), а замедления больше порога выводятся как регрессии.
+
+Запуск: python micro_benchmark.py [--output results.json] [--compare old.json] [--filter keyboard]
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("BOT_TOKEN", "123456:micro-benchmark")
+
+from bothandler import bothandler
+from keyboard import keyboard
+from logger import logger
+from models import PollOption, PollSummary, User
+from repository import QUERIES, repository
+import config
+
+
+class fakerecord(tuple):
+    """Строка результата с доступом по индексу и по имени столбца, как asyncpg.Record."""
+
+    __slots__ = ()
+    columns = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = self.columns[key]
+        return super().__getitem__(key)
+
+
+def records(columns, rows):
+    record = type("record", (fakerecord,), {"__slots__": (), "columns": {name: i for i, name in enumerate(columns)}})
+    return [record(row) for row in rows]
+
+
+class fakeconnection:
+    """Соединение, которое отвечает на запросы репозитория заранее заготовленными строками."""
+
+    def __init__(self, results):
+        self.results = results  # текст запроса -> строки
+
+    async def fetch(self, query, *args):
+        return self.results.get(query, [])
+
+    async def fetchrow(self, query, *args):
+        rows = self.results.get(query)
+        return rows[0] if rows else None
+
+    async def fetchval(self, query, *args):
+        row = await self.fetchrow(query, *args)
+        return None if row is None else row[0]
+
+    async def execute(self, query, *args):
+        return "OK"
+
+
+class fakepool:
+    def __init__(self, results):
+        self.connection = fakeconnection({QUERIES[name]: rows for name, rows in results.items()})
+
+    def acquire(self, *, timeout=None):
+        return _fakeacquire(self.connection)
+
+    async def close(self):
+        pass
+
+
+class _fakeacquire:
+    def __init__(self, connection):
+        self.connection = connection
+
+    async def __aenter__(self):
+        return self.connection
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class fakeuser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.username = f"user{user_id}"
+        self.first_name = "Бенчмарк"
+
+
+class fakemessage:
+    """Входящее сообщение: ответы бота только подсчитываются."""
+
+    def __init__(self, text, user_id=1):
+        self.text = text
+        self.from_user = fakeuser(user_id)
+        self.answers = 0
+
+    async def answer(self, text, **kwargs):
+        self.answers += 1
+
+
+def fixtures():
+    now = datetime(2025, 1, 1, 12, 0)
+    page_size = config.сonfig.STATS_PAGE_SIZE
+    stats_rows = records(
+        ("id", "title", "created_at", "end_time", "is_active", "option_texts", "option_votes"),
+        [
+            (poll_id, f"Голосование {poll_id}", now, now + timedelta(days=1), poll_id % 2 == 0,
+             [f"Вариант {i}" for i in range(4)], [poll_id * i for i in range(4)])
+            for poll_id in range(1, page_size + 2)  # Лишняя строка даёт кнопку «Далее»
+        ]
+    )
+    poll_rows = records(
+        ("id", "title", "end_time"),
+        [(poll_id, f"Голосование {poll_id}", now) for poll_id in range(1, 101)]
+    )
+    return {
+        "statistics_page_next": stats_rows,
+        "active_polls_for_user": poll_rows,
+        "active_polls": poll_rows,
+        "vote_polls_page_next": poll_rows[:config.сonfig.VOTE_POLLS_PAGE_SIZE + 1],
+    }
+
+
+async def cases():
+    """Возвращает {имя: функция без аргументов}; функция может быть асинхронной."""
+    config.сonfig.LOG_STDOUT = False
+    config.сonfig.LOG_FILE = None
+    logger.sampling = {}  # Без выборки каждое событие стоит одинаково
+
+    handler = bothandler()
+    handler.pool = fakepool(fixtures())
+    handler.db = repository(handler.pool)
+
+    stats_message = fakemessage("Статистика")
+    long_message = fakemessage("")
+    long_text = "\n".join(f"ID: {i} - пользователь{i}" for i in range(2000))
+    tallies = await handler.db.fetch_tallies("statistics_page_next")
+
+    polls = [PollSummary(i, f"Голосование {i}", datetime.now()) for i in range(1, config.сonfig.VOTE_POLLS_PAGE_SIZE + 1)]
+    options = [PollOption(i, f"Вариант {i}") for i in range(1, 11)]
+    users = [User(i, f"user{i}", f"user{i}") for i in range(1, config.сonfig.USERS_PAGE_SIZE + 1)]
+    selected = {user.telegram_id for user in users[::2]}
+    log_item = (time.time(), "INFO", "message", {"user_id": 1, "username": "user1", "first_name": "Бенчмарк", "text": "Статистика"})
+
+    return {
+        "statistika.handle": lambda: handler.handle_statistika(stats_message),
+        "statistika.format": lambda: "".join(handler.format_poll_stats(tally) for tally in tallies),
+        "statistika.fetch_tallies": lambda: handler.db.fetch_tallies("statistics_page_next"),
+        "keyboard.start": keyboard.get_start_keyboard,
+        "keyboard.vote_polls": lambda: keyboard.get_vote_polls_keyboard(polls, True, True),
+        "keyboard.vote_options": lambda: keyboard.get_vote_options_keyboard(1, options),
+        "keyboard.stats_page": lambda: keyboard.get_stats_page_keyboard(1, 5, True, True),
+        "keyboard.users_page": lambda: keyboard.get_users_page_keyboard(users, selected, True, True, True),
+        "send_long_message": lambda: handler.send_long_message(long_message, long_text),
+        "logger.log_message": lambda: logger.log_message(stats_message),
+        "logger.format": lambda: logger._write(log_item),
+        "fetch_active_polls": lambda: handler.fetch_active_polls(user_id=1),
+        "fetch_vote_polls_page": lambda: handler.fetch_vote_polls_page(1, 0, False),
+    }
+
+
+async def measure(func, min_time, repeat):
+    """Подбирает число вызовов на замер (не меньше min_time секунд) и делает repeat замеров.
+
+    Возвращает время одного вызова в секундах для каждого замера.
+    """
+    is_async = inspect.isawaitable(result := func())
+    if is_async:
+        await result
+
+    async def run(number):
+        started = time.perf_counter()
+        if is_async:
+            for _ in range(number):
+                await func()
+        else:
+            for _ in range(number):
+                func()
+        return time.perf_counter() - started
+
+    number = 1
+    while (elapsed := await run(number)) < min_time:
+        number *= 10 if elapsed < min_time / 10 else 2
+    return number, [await run(number) / number for _ in range(repeat)]
+
+
+async def run_cases(name_filter, min_time, repeat):
+    selected = {name: func for name, func in (await cases()).items() if name_filter in name}
+    results = {}
+    for name, func in selected.items():
+        number, timings = await measure(func, min_time, repeat)
+        timings.sort()
+        results[name] = {
+            "number": number,
+            "best_us": timings[0] * 1e6,
+            "median_us": timings[len(timings) // 2] * 1e6,
+        }
+        print(f"{name:<28}{results[name]['median_us']:>12.2f} мкс  (лучший {results[name]['best_us']:.2f}, вызовов {number} x {repeat})")
+    logger.stop()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Выводит изменение медианы относительно прошлого запуска; возвращает число регрессий."""
+    print(f"\nСравнение с {baseline.get('commit') or 'прошлым запуском'} ({baseline.get('created_at')}):")
+    regressions = 0
+    for name, result in results.items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:<28}{'новый':>12}")
+            continue
+        ratio = result["median_us"] / old["median_us"]
+        mark = ""
+        if ratio > threshold:
+            mark = "  ⚠️ регрессия"
+            regressions += 1
+        print(f"{name:<28}{old['median_us']:>10.2f} → {result['median_us']:.2f} мкс  x{ratio:.2f}{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="файл JSON с результатами (по умолчанию micro_benchmark-<коммит>.json)")
+    parser.add_argument("--compare", help="файл JSON прошлого запуска для сравнения")
+    parser.add_argument("--threshold", type=float, default=1.1, help="замедление, которое считается регрессией")
+    parser.add_argument("--filter", default="", help="запускать только бенчмарки, в имени которых есть подстрока")
+    parser.add_argument("--min-time", type=float, default=0.2, help="минимальная длительность одного замера, с")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = asyncio.run(run_cases(args.filter, args.min_time, args.repeat))
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    output = args.output or f"micro_benchmark-{commit or 'local'}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты сохранены в {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+
+# Модели строятся один раз на границе репозитория: поля идут в порядке столбцов
+# запроса, поэтому объект создаётся из строки asyncpg позиционно — Model(*row)
+
+@dataclass(frozen=True, slots=True)
+class Poll:
+    id: int
+    title: str
+    creator_id: int
+    end_time: datetime
+    is_active: bool
+    is_private: bool
+
+
+@dataclass(frozen=True, slots=True)
+class PollSummary:
+    """Голосование в списке для выбора."""
+    id: int
+    title: str
+    end_time: datetime
+
+
+@dataclass(frozen=True, slots=True)
+class PollOption:
+    id: int
+    option_text: str
+
+
+@dataclass(frozen=True, slots=True)
+class User:
+    telegram_id: int
+    username: str | None
+    name_key: str = ""  # Ключ сортировки страницы пользователей
+
+
+@dataclass(frozen=True, slots=True)
+class Tally:
+    """Результаты голосования: варианты с числом голосов в порядке вариантов."""
+    id: int
+    title: str
+    created_at: datetime
+    end_time: datetime
+    is_active: bool
+    options: tuple  # ((option_text, votes), ...)
+
+    @property
+    def votes(self):
+        return sum(votes for _, votes in self.options)
@@ -0,0 +1,130 @@
+import json
+from typing import Any, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from cache import lrucache
+
+
+class PostgresStorage(BaseStorage):
+    """FSM-хранилище в таблице fsm_storage с локальным кэшем на время обработки обновления.
+
+    Чтение идёт через кэш: первый get_state/get_data по ключу загружает запись
+    из БД, остальные обращения в рамках обновления обслуживаются из памяти.
+    Записи копятся в кэше и сбрасываются одним upsert в release(), который
+    вызывает PostgresStorageMiddleware после обработки обновления.
+    """
+
+    def __init__(self, pool=None, cache_size: int = 1024, cache_ttl: float = 5):
+        self.pool = pool  # Пул задаётся после инициализации БД
+        self._cache = lrucache(cache_size, cache_ttl)  # key -> [state, data]
+        self._dirty = {}  # Изменённые записи держим отдельно, чтобы их не вытеснил кэш
+
+    @staticmethod
+    def _key_columns(key: StorageKey):
+        return (
+            key.bot_id,
+            key.chat_id,
+            key.user_id,
+            key.thread_id or 0,
+            key.business_connection_id or "",
+            key.destiny,
+        )
+
+    async def _load(self, key: StorageKey):
+        record = self._dirty.get(key) or self._cache.get(key)
+        if record is not None:
+            return record
+
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                SELECT state, data FROM fsm_storage
+                WHERE bot_id = $1 AND chat_id = $2 AND user_id = $3
+                    AND thread_id = $4 AND business_connection_id = $5 AND destiny = $6
+                """,
+                *self._key_columns(key)
+            )
+
+        record = [row['state'], json.loads(row['data'])] if row else [None, {}]
+        self._cache.set(key, record)
+        return record
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._load(key)
+        record[0] = state.state if isinstance(state, State) else state
+        self._dirty[key] = record
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = await self._load(key)
+        return record[0]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._load(key)
+        record[1] = data.copy()
+        self._dirty[key] = record
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = await self._load(key)
+        return record[1].copy()
+
+    async def flush(self, keys=None):
+        """Записывает изменённые записи в БД одним upsert."""
+        keys = list(self._dirty) if keys is None else [key for key in keys if key in self._dirty]
+        records = [(key, self._dirty.pop(key)) for key in keys]
+        if not records:
+            return
+
+        columns = list(zip(*(
+            self._key_columns(key) + (record[0], json.dumps(record[1]))
+            for key, record in records
+        )))
+        try:
+            await self._upsert(columns)
+        except Exception:
+            for key, record in records:
+                self._dirty.setdefault(key, record)  # Повторим при следующем сбросе
+            raise
+
+    async def _upsert(self, columns):
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO fsm_storage
+                    (bot_id, chat_id, user_id, thread_id, business_connection_id, destiny, state, data, updated_at)
+                SELECT bot_id, chat_id, user_id, thread_id, business_connection_id, destiny, state, data::jsonb, NOW()
+                FROM unnest($1::bigint[], $2::bigint[], $3::bigint[], $4::bigint[], $5::text[], $6::text[], $7::text[], $8::text[])
+                    AS r(bot_id, chat_id, user_id, thread_id, business_connection_id, destiny, state, data)
+                ON CONFLICT (bot_id, chat_id, user_id, thread_id, business_connection_id, destiny) DO UPDATE
+                SET state = EXCLUDED.state, data = EXCLUDED.data, updated_at = EXCLUDED.updated_at
+                """,
+                *(list(column) for column in columns)
+            )
+
+    async def release(self, key: StorageKey):
+        """Сбрасывает изменения ключа и убирает его из кэша после обработки обновления."""
+        try:
+            await self.flush([key])
+        finally:
+            self._cache.pop(key)
+
+    async def close(self) -> None:
+        if self.pool:
+            await self.flush()
+
+
+class PostgresStorageMiddleware(BaseMiddleware):
+    """Сохраняет FSM-состояние пользователя после обработки каждого обновления."""
+
+    def __init__(self, storage: PostgresStorage):
+        self.storage = storage
+
+    async def __call__(self, handler, event, data):
+        try:
+            return await handler(event, data)
+        finally:
+            state = data.get('state')
+            if state is not None:
+                await self.storage.release(state.key)
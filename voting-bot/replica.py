@@ -0,0 +1,106 @@
+import asyncio
+import time
+from collections import deque
+
+from logger import logger
+from repository import QUERIES
+
+
+class replica:
+    """Пул реплики только для чтения с проверкой её отставания от primary.
+
+    Фоновая задача раз в check_interval секунд запоминает текущий LSN primary и
+    спрашивает у реплики, какой LSN она уже применила. synced_at — момент
+    последнего замера primary, до которого реплика уже дошла: всё, что было
+    закоммичено до него, на реплике видно. Отставание — время, прошедшее с
+    synced_at; если WAL receiver не подключён к primary, реплика считается
+    недоступной. Реплика пригодна для
+    чтения, пока отвечает и отстаёт не больше чем на max_lag секунд; иначе
+    репозиторий читает из primary. Ошибка соединения при чтении выводит реплику
+    из работы до следующей успешной проверки.
+    """
+
+    def __init__(self, pool, primary, max_lag: float = 5, check_interval: float = 1, timeout: float = 2):
+        self.pool = pool
+        self.primary = primary  # Пул primary: с его LSN сравнивается реплика
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.timeout = timeout  # Ожидание соединения с репликой: дольше читаем из primary
+        self.lag = None  # Отставание в секундах; None — реплика недоступна
+        self.synced_at = None  # time.monotonic() замера primary, до которого дошла реплика
+        self._samples = deque()  # (время замера, LSN primary)
+        self._task = None
+
+    @property
+    def available(self):
+        return self.lag is not None and self.lag <= self.max_lag
+
+    def acquire(self):
+        return self.pool.acquire(timeout=self.timeout)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def check(self):
+        # Время замера берётся до запроса LSN primary: всё, что закоммичено раньше,
+        # входит в этот LSN. LSN primary берётся раньше состояния реплики: догнав
+        # его, реплика содержит всё, что было записано к моменту замера
+        sampled_at = time.monotonic()
+        try:
+            async with self.primary.acquire(timeout=self.timeout) as conn:
+                primary_lsn = await conn.fetchval(QUERIES["primary_wal_lsn"], timeout=self.timeout)
+            async with self.acquire() as conn:
+                status = await conn.fetchrow(QUERIES["replica_status"], timeout=self.timeout)
+        except Exception as e:
+            self.failed(e)
+            return
+
+        now = time.monotonic()
+        self._samples.append((sampled_at, primary_lsn))
+        # Замеры старше max_lag не нужны: реплика, которая дошла только до них, уже недоступна
+        while len(self._samples) > 1 and now - self._samples[1][0] > self.max_lag:
+            self._samples.popleft()
+
+        if not status['in_recovery']:
+            self.synced_at = sampled_at
+            self._update(0.0)  # Не реплика (например, после promote): данные актуальны
+        elif not status['streaming']:
+            self._update(None, "WAL receiver не подключён к primary")
+        else:
+            self.synced_at = self._synced_at(status['replay_lsn'])
+            self._update(None if self.synced_at is None else now - self.synced_at)
+
+    def _synced_at(self, replay_lsn):
+        """Время последнего замера primary, до которого реплика дошла; None — ни до одного."""
+        for sampled_at, primary_lsn in reversed(self._samples):
+            if replay_lsn >= primary_lsn:
+                return sampled_at
+        return None
+
+    def failed(self, error):
+        self._update(None, error)
+
+    def _update(self, lag, error=None):
+        was_available = self.available
+        self.lag = lag
+        if self.available == was_available:
+            return
+        if self.available:
+            logger.log("INFO", "replica_available", lag=lag)
+        else:
+            logger.log("WARNING", "replica_unavailable", lag=lag, error=str(error) if error else None)
+
+    async def _run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.check_interval)
@@ -0,0 +1,434 @@
+import asyncio
+import time
+
+import asyncpg
+
+from cache import lrucache
+from models import Tally
+
+
+# Результаты голосований из CTE page (id, title, created_at, end_time, is_active):
+# строка на голосование с массивами вариантов и их голосов по счётчикам vote_counters.
+# Общий хвост запросов статистики, чтобы агрегация не расходилась между ними
+_TALLIES = """
+        SELECT
+            p.id,
+            p.title,
+            p.created_at,
+            p.end_time,
+            p.is_active,
+            array_agg(po.option_text ORDER BY po.id) AS option_texts,
+            array_agg(COALESCE(vc.votes_count, 0) ORDER BY po.id) AS option_votes
+        FROM
+            page p
+        JOIN
+            poll_options po ON p.id = po.poll_id
+        LEFT JOIN (
+            SELECT option_id, SUM(votes_count)::bigint AS votes_count
+            FROM vote_counters
+            WHERE poll_id IN (SELECT id FROM page)
+            GROUP BY option_id
+        ) vc ON vc.option_id = po.id
+        GROUP BY
+            p.id, p.title, p.created_at, p.end_time, p.is_active
+        ORDER BY
+            p.id
+"""
+
+
+# Все SQL-запросы бота по именам
+QUERIES = {
+    # Пользователи
+    "upsert_user": """
+        INSERT INTO users (telegram_id, username)
+        VALUES ($1, $2)
+        ON CONFLICT (telegram_id) DO UPDATE SET username = EXCLUDED.username
+        WHERE users.username IS DISTINCT FROM EXCLUDED.username
+        RETURNING (xmax = 0)
+    """,
+    "users_page_next": """
+        SELECT telegram_id, username, lower(COALESCE(username, '')) COLLATE "C" AS name_key
+        FROM users
+        WHERE lower(COALESCE(username, '')) COLLATE "C" >= $1
+            AND lower(COALESCE(username, '')) COLLATE "C" < $2
+            AND (lower(COALESCE(username, '')) COLLATE "C", telegram_id) > ($3, $4)
+        ORDER BY lower(COALESCE(username, '')) COLLATE "C" ASC, telegram_id ASC
+        LIMIT $5
+    """,
+    "users_page_prev": """
+        SELECT telegram_id, username, lower(COALESCE(username, '')) COLLATE "C" AS name_key
+        FROM users
+        WHERE lower(COALESCE(username, '')) COLLATE "C" >= $1
+            AND lower(COALESCE(username, '')) COLLATE "C" < $2
+            AND (lower(COALESCE(username, '')) COLLATE "C", telegram_id) < ($3, $4)
+        ORDER BY lower(COALESCE(username, '')) COLLATE "C" DESC, telegram_id DESC
+        LIMIT $5
+    """,
+
+    # Голосования
+    "poll": "SELECT id, title, creator_id, end_time, is_active, is_private FROM polls WHERE id = $1",
+    "poll_options": "SELECT id, option_text FROM poll_options WHERE poll_id = $1 ORDER BY id",
+    "active_polls": "SELECT id, title, end_time FROM polls WHERE is_active = TRUE AND end_time > NOW() ORDER BY id",
+    "active_polls_for_user": """
+        SELECT id, title, end_time FROM polls
+        WHERE is_active = TRUE AND end_time > NOW()
+            AND (is_private = FALSE OR id IN (
+                SELECT poll_id
+                FROM poll_participants
+                WHERE user_id = $1))
+        ORDER BY id
+    """,
+    # Страница доступных пользователю голосований для кнопок «Проголосовать»:
+    # keyset-пагинация по id, страница всегда по возрастанию id. Активных голосований
+    # немного, поэтому они выбираются по ix_polls_is_active_end_time и сортируются,
+    # а не перебираются по первичному ключу среди всех завершённых (MATERIALIZED)
+    "vote_polls_page_next": """
+        WITH available AS MATERIALIZED (
+            SELECT id, title, end_time FROM polls
+            WHERE is_active = TRUE AND end_time > NOW()
+                AND (is_private = FALSE OR id IN (
+                    SELECT poll_id
+                    FROM poll_participants
+                    WHERE user_id = $1))
+                AND id > $2
+        )
+        SELECT id, title, end_time FROM available
+        ORDER BY id ASC
+        LIMIT $3
+    """,
+    "vote_polls_page_prev": """
+        WITH available AS MATERIALIZED (
+            SELECT id, title, end_time FROM polls
+            WHERE is_active = TRUE AND end_time > NOW()
+                AND (is_private = FALSE OR id IN (
+                    SELECT poll_id
+                    FROM poll_participants
+                    WHERE user_id = $1))
+                AND id < $2
+        ), page AS (
+            SELECT id, title, end_time FROM available
+            ORDER BY id DESC
+            LIMIT $3
+        )
+        SELECT id, title, end_time FROM page
+        ORDER BY id ASC
+    """,
+    "active_private_polls": """
+        SELECT id, title, end_time FROM polls
+        WHERE is_active = TRUE AND is_private = TRUE AND creator_id = $1
+    """,
+    "create_poll": """
+        WITH creator AS (
+            -- Обычно создателя уже сохранил UserMiddleware, тогда строка не переписывается
+            INSERT INTO users (telegram_id, username)
+            VALUES ($1, $2)
+            ON CONFLICT (telegram_id) DO NOTHING
+        ),
+        poll AS (
+            INSERT INTO polls (title, creator_id, end_time, is_active, is_private, data_type)
+            VALUES ($3, $1, $4, TRUE, $5, $6)
+            RETURNING id
+        ),
+        options AS (
+            INSERT INTO poll_options (poll_id, option_text)
+            SELECT poll.id, o.option_text
+            FROM poll, unnest($7::text[]) WITH ORDINALITY AS o(option_text, position)
+            ORDER BY o.position
+        ),
+        participants AS (
+            INSERT INTO poll_participants (poll_id, user_id)
+            SELECT DISTINCT poll.id, p.user_id
+            FROM poll, unnest($8::bigint[]) AS p(user_id)
+            ON CONFLICT DO NOTHING
+        )
+        SELECT id FROM poll
+    """,
+    "add_poll_participants": """
+        INSERT INTO poll_participants (poll_id, user_id)
+        SELECT DISTINCT $1::bigint, p.user_id
+        FROM unnest($2::bigint[]) AS p(user_id)
+        ON CONFLICT DO NOTHING
+    """,
+    "end_poll": "UPDATE polls SET is_active = FALSE WHERE id = $1",
+    "delete_poll_participants": "DELETE FROM poll_participants WHERE poll_id = $1",
+    "delete_poll_settings": "DELETE FROM poll_settings WHERE poll_id = $1",
+    "delete_poll": "DELETE FROM polls WHERE id = $1",
+    "active_poll_deadlines": "SELECT id, end_time FROM polls WHERE is_active = TRUE",
+    "close_expired_polls": "UPDATE polls SET is_active = FALSE WHERE is_active = TRUE AND end_time <= $1 RETURNING id",
+
+    # Голоса и счётчики
+    "submit_votes": """
+        WITH req AS (
+            SELECT *
+            FROM unnest($1::bigint[], $2::bigint[], $3::text[], $4::bigint[])
+                WITH ORDINALITY AS r(poll_id, user_id, username, option_id, idx)
+        ),
+        poll AS (
+            -- Блокировка строк не даёт end_poll завершить голосование посреди записи голосов
+            SELECT id, is_private, (is_active AND end_time > NOW()) AS is_open
+            FROM polls
+            WHERE id IN (SELECT poll_id FROM req)
+            FOR SHARE
+        ),
+        checked AS (
+            SELECT
+                req.idx,
+                req.poll_id,
+                req.user_id,
+                COALESCE(poll.is_open, FALSE) AS is_open,
+                NOT poll.is_private OR EXISTS (
+                    SELECT 1 FROM poll_participants pp
+                    WHERE pp.poll_id = req.poll_id AND pp.user_id = req.user_id
+                ) AS allowed,
+                EXISTS (
+                    SELECT 1 FROM votes v
+                    WHERE v.poll_id = req.poll_id AND v.user_id = req.user_id
+                ) AS voted,
+                (
+                    SELECT po.id FROM poll_options po
+                    WHERE po.id = req.option_id AND po.poll_id = req.poll_id
+                ) AS option_id,
+                ROW_NUMBER() OVER (PARTITION BY req.poll_id, req.user_id ORDER BY req.idx) = 1 AS is_first
+            FROM req
+            LEFT JOIN poll ON poll.id = req.poll_id
+        ),
+        upserted_users AS (
+            -- Страховка для внешнего ключа votes: известных пользователей не переписываем
+            INSERT INTO users (telegram_id, username)
+            SELECT DISTINCT ON (user_id) user_id, username
+            FROM req
+            ORDER BY user_id, idx DESC
+            ON CONFLICT (telegram_id) DO NOTHING
+        ),
+        inserted AS (
+            INSERT INTO votes (poll_id, user_id, option_id)
+            SELECT poll_id, user_id, option_id
+            FROM checked
+            WHERE is_open AND allowed AND NOT voted AND is_first AND option_id IS NOT NULL
+            ON CONFLICT (poll_id, user_id) DO NOTHING
+            RETURNING poll_id, user_id, option_id
+        ),
+        counted AS (
+            INSERT INTO vote_counters (poll_id, option_id, shard, votes_count)
+            SELECT poll_id, option_id, (user_id % $5)::smallint, COUNT(*)
+            FROM inserted
+            GROUP BY poll_id, option_id, (user_id % $5)::smallint
+            -- Строки счётчиков блокируются всегда в одном порядке: параллельные пачки не взаимоблокируются
+            ORDER BY option_id, (user_id % $5)::smallint
+            ON CONFLICT (option_id, shard) DO UPDATE
+            SET votes_count = vote_counters.votes_count + EXCLUDED.votes_count
+        )
+        SELECT CASE
+            WHEN NOT c.is_open THEN $6
+            WHEN NOT c.allowed THEN $7
+            WHEN c.voted OR NOT c.is_first THEN $8
+            WHEN c.option_id IS NULL THEN $9
+            WHEN EXISTS (
+                SELECT 1 FROM inserted i WHERE i.poll_id = c.poll_id AND i.user_id = c.user_id
+            ) THEN $10
+            ELSE $8  -- Голос параллельно записан другим запросом
+        END AS outcome
+        FROM checked c
+        ORDER BY c.idx
+    """,
+    "check_vote_counters": """
+        SELECT DISTINCT po.poll_id
+        FROM poll_options po
+        LEFT JOIN (
+            SELECT option_id, COUNT(*) AS cnt FROM votes GROUP BY option_id
+        ) v ON v.option_id = po.id
+        LEFT JOIN (
+            SELECT option_id, SUM(votes_count) AS cnt FROM vote_counters GROUP BY option_id
+        ) c ON c.option_id = po.id
+        WHERE COALESCE(v.cnt, 0) <> COALESCE(c.cnt, 0)
+    """,
+    "lock_vote_counters": "LOCK TABLE vote_counters IN EXCLUSIVE MODE",
+    # Сверку счётчиков одновременно выполняет только один процесс (сессионная advisory-блокировка)
+    "try_lock_reconcile_vote_counters": "SELECT pg_try_advisory_lock(hashtext('reconcile_vote_counters'))",
+    "unlock_reconcile_vote_counters": "SELECT pg_advisory_unlock(hashtext('reconcile_vote_counters'))",
+    "delete_all_vote_counters": "DELETE FROM vote_counters",
+    "rebuild_all_vote_counters": """
+        INSERT INTO vote_counters (poll_id, option_id, shard, votes_count)
+        SELECT poll_id, option_id, 0, COUNT(*) FROM votes GROUP BY poll_id, option_id
+    """,
+    "delete_vote_counters": "DELETE FROM vote_counters WHERE poll_id = ANY($1::bigint[])",
+    "rebuild_vote_counters": """
+        INSERT INTO vote_counters (poll_id, option_id, shard, votes_count)
+        SELECT poll_id, option_id, 0, COUNT(*) FROM votes
+        WHERE poll_id = ANY($1::bigint[])
+        GROUP BY poll_id, option_id
+    """,
+
+    # Статистика и живые результаты
+    "statistics_page_next": """
+        WITH page AS (
+            SELECT id, title, created_at, end_time, is_active
+            FROM polls
+            WHERE
+                (is_private = false OR id IN (
+                    SELECT poll_id FROM poll_participants WHERE user_id = $1
+                ))
+                AND id > $2
+            ORDER BY id ASC
+            LIMIT $3
+        )
+    """ + _TALLIES,
+    "statistics_page_prev": """
+        WITH page AS (
+            SELECT id, title, created_at, end_time, is_active
+            FROM polls
+            WHERE
+                (is_private = false OR id IN (
+                    SELECT poll_id FROM poll_participants WHERE user_id = $1
+                ))
+                AND id < $2
+            ORDER BY id DESC
+            LIMIT $3
+        )
+    """ + _TALLIES,
+    "poll_stats": """
+        WITH page AS (
+            SELECT id, title, created_at, end_time, is_active FROM polls WHERE id = $1
+        )
+    """ + _TALLIES,
+    "save_live_results": """
+        INSERT INTO live_results (poll_id, chat_id, message_id) VALUES ($1, $2, $3)
+        ON CONFLICT (poll_id) DO UPDATE
+        SET chat_id = EXCLUDED.chat_id, message_id = EXCLUDED.message_id, created_at = now()
+    """,
+    "active_live_results": """
+        SELECT lr.poll_id, lr.chat_id, lr.message_id
+        FROM live_results lr
+        JOIN polls p ON p.id = lr.poll_id
+        WHERE p.is_active = TRUE
+    """,
+
+    # Проверка реплики: текущий LSN primary и LSN, применённый репликой (байты от 0/0).
+    # Без роли pg_read_all_stats статус WAL receiver не виден, тогда достаточно того,
+    # что процесс receiver запущен
+    "primary_wal_lsn": """
+        SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), '0/0')::bigint
+    """,
+    "replica_status": """
+        SELECT
+            pg_is_in_recovery() AS in_recovery,
+            pg_wal_lsn_diff(pg_last_wal_replay_lsn(), '0/0')::bigint AS replay_lsn,
+            EXISTS (
+                SELECT 1 FROM pg_stat_wal_receiver WHERE COALESCE(status, 'streaming') = 'streaming'
+            ) AS streaming
+    """,
+}
+
+# Запросы только на чтение, которые можно выполнять на реплике. Голосование и его
+# варианты (горячий путь голоса) и статистика живых результатов читаются из primary:
+# им нельзя видеть устаревшие данные
+REPLICA_QUERIES = frozenset({
+    "users_page_next",
+    "users_page_prev",
+    "active_polls",
+    "active_polls_for_user",
+    "vote_polls_page_next",
+    "vote_polls_page_prev",
+    "active_private_polls",
+    "statistics_page_next",
+    "statistics_page_prev",
+})
+
+# Ошибки соединения с репликой (в том числе реплика ещё запускается или восстанавливается):
+# чтение повторяется в primary, реплика выводится из работы до следующей проверки
+REPLICA_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.InterfaceError,
+    asyncpg.CannotConnectNowError,
+)
+
+# Hot standby отменяет запрос или обрывает соединение при конфликте с применением WAL
+# (SQLSTATE 40001, 40P01): реплика исправна, повторяется только этот запрос в primary
+RECOVERY_CONFLICT_ERRORS = (asyncpg.TransactionRollbackError,)
+
+
+class repository:
+    """Доступ к БД через именованные запросы.
+
+    Тексты запросов постоянны, поэтому asyncpg готовит каждый из них один раз на
+    соединение и дальше выполняет подготовленный оператор из кэша соединения
+    (statement_cache_size) без повторного разбора и планирования. Методам можно
+    передать уже взятое соединение conn, чтобы несколько запросов одной операции
+    выполнялись через одно соединение.
+
+    Если задана реплика, запросы из REPLICA_QUERIES выполняются на ней, пока она
+    доступна и отстаёт не больше допустимого. Чтобы пользователь видел свой
+    голос, время его последней записи (wrote) запоминается в памяти процесса, и
+    чтения этого пользователя (reader) идут в primary, пока реплика не дойдёт до
+    замера primary, сделанного позже этой записи. Обновления одного пользователя
+    обрабатывает один процесс (shardrunner маршрутизирует их по ID пользователя),
+    поэтому отметки не нужно хранить в БД.
+    """
+
+    def __init__(self, pool, acquire_timeout=None, replica=None, max_writers: int = 100000):
+        self.pool = pool
+        self.acquire_timeout = acquire_timeout
+        self.replica = replica
+        self._writes = None  # user_id -> time.monotonic() последней записи
+        if replica is not None:
+            # Доступная реплика не отстаёт от текущего момента больше чем на max_lag
+            # плюс интервал и длительность проверки: более старые отметки не нужны
+            ttl = replica.max_lag + replica.check_interval + 4 * replica.timeout
+            self._writes = lrucache(max_writers, ttl)
+
+    def acquire(self):
+        return self.pool.acquire(timeout=self.acquire_timeout)
+
+    def wrote(self, user_id):
+        """Отмечает запись пользователя: его чтения идут в primary, пока реплика её не применит."""
+        if self._writes is not None:
+            self._writes.set(user_id, time.monotonic())
+
+    async def fetch(self, name, *args, conn=None, reader=None):
+        return await self._run("fetch", name, args, conn, reader)
+
+    async def fetchrow(self, name, *args, conn=None, reader=None):
+        return await self._run("fetchrow", name, args, conn, reader)
+
+    async def fetchval(self, name, *args, conn=None, reader=None):
+        return await self._run("fetchval", name, args, conn, reader)
+
+    async def execute(self, name, *args, conn=None):
+        return await self._run("execute", name, args, conn)
+
+    async def fetch_all(self, model, name, *args, conn=None, reader=None):
+        """Выполняет запрос и собирает строки в модели (столбцы в порядке полей модели)."""
+        return [model(*row) for row in await self.fetch(name, *args, conn=conn, reader=reader)]
+
+    async def fetch_one(self, model, name, *args, conn=None, reader=None):
+        row = await self.fetchrow(name, *args, conn=conn, reader=reader)
+        return None if row is None else model(*row)
+
+    async def fetch_tallies(self, name, *args, conn=None, reader=None):
+        """Собирает результаты голосований: строка запроса — голосование с массивами вариантов и голосов."""
+        return [
+            Tally(*row[:5], tuple(zip(row['option_texts'], row['option_votes'])))
+            for row in await self.fetch(name, *args, conn=conn, reader=reader)
+        ]
+
+    def _reads_from_replica(self, name, reader):
+        if self.replica is None or name not in REPLICA_QUERIES or not self.replica.available:
+            return False
+        written_at = None if reader is None else self._writes.get(reader)
+        return written_at is None or written_at <= self.replica.synced_at
+
+    async def _run(self, method, name, args, conn, reader=None):
+        if conn is not None:
+            return await getattr(conn, method)(QUERIES[name], *args)
+        if self._reads_from_replica(name, reader):
+            try:
+                async with self.replica.acquire() as conn:
+                    return await getattr(conn, method)(QUERIES[name], *args)
+            except REPLICA_ERRORS as e:
+                self.replica.failed(e)  # До следующей проверки читаем из primary
+            except RECOVERY_CONFLICT_ERRORS:
+                pass
+        async with self.acquire() as conn:
+            return await getattr(conn, method)(QUERIES[name], *args)
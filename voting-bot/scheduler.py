@@ -0,0 +1,74 @@
+import asyncio
+import heapq
+from datetime import datetime
+
+
+class expiryscheduler:
+    """Планировщик завершения голосований по сроку.
+
+    Держит в памяти min-кучу ближайших end_time и спит ровно до следующего
+    срока, после чего одним вызовом close_func завершает все наступившие.
+    """
+
+    def __init__(self, close_func):
+        self.close_func = close_func  # async (now) -> список ID завершённых голосований
+        self._heap = []  # [(end_time, poll_id)]
+        self._deadlines = {}  # poll_id -> end_time; записи кучи без пары здесь устарели
+        self._changed = asyncio.Event()
+        self._task = None
+
+    def schedule(self, poll_id, end_time):
+        self._deadlines[poll_id] = end_time
+        heapq.heappush(self._heap, (end_time, poll_id))
+        if self._heap[0] == (end_time, poll_id):
+            self._changed.set()  # Новый срок раньше текущего — будим цикл
+
+    def discard(self, poll_id):
+        # Запись в куче удалится лениво, когда дойдёт до вершины
+        self._deadlines.pop(poll_id, None)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def _drop_stale(self):
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    async def _run(self):
+        while True:
+            self._drop_stale()
+            if not self._heap:
+                await self._changed.wait()
+            else:
+                delay = (self._heap[0][0] - datetime.now()).total_seconds()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+            self._changed.clear()
+
+            self._drop_stale()
+            now = datetime.now()
+            if not self._heap or self._heap[0][0] > now:
+                continue
+
+            try:
+                await self.close_func(now)
+            except Exception as e:
+                print(f"Ошибка при завершении голосований по сроку: {e}")
+                await asyncio.sleep(1)  # Повторим попытку позже
+                continue
+
+            while self._heap and self._heap[0][0] <= now:
+                end_time, poll_id = heapq.heappop(self._heap)
+                if self._deadlines.get(poll_id) == end_time:
+                    del self._deadlines[poll_id]
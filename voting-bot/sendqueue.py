@@ -0,0 +1,166 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from cache import lrucache
+from logger import logger
+
+
+INTERACTIVE = 0
+BULK = 1
+
+_priority = contextvars.ContextVar("send_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def bulk():
+    """Помечает отправки внутри блока как массовые: ответы пользователям идут раньше них."""
+    token = _priority.set(BULK)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def split_text(text: str, limit: int = 4096):
+    """Делит текст на части не длиннее limit по границам строк."""
+    parts = []
+    current = ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > limit:  # Строку длиннее лимита приходится резать
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:limit])
+            line = line[limit:]
+        if len(current) + len(line) > limit:
+            parts.append(current)
+            current = ""
+        current += line
+    if current:
+        parts.append(current)
+    return [part for part in parts if part.strip()]
+
+
+class sendqueue:
+    """Очередь исходящих запросов к Telegram с учётом лимитов Bot API.
+
+    Запрос сначала ждёт токен в бакете своего чата (в группах лимит строже), затем
+    в общем бакете бота. Общий бакет раздаёт токены по приоритету: ответы
+    пользователям раньше массовых отправок. Ответ 429 (TelegramRetryAfter)
+    блокирует отправки в этот чат до истечения retry_after и повторяет запрос;
+    срок блокировки хранится отдельно от бакетов и не вытесняется вместе с ними.
+    """
+
+    def __init__(self, rate: float = 30, chat_rate: float = 1, chat_burst: int = 3,
+                 group_rate: float = 20 / 60, group_burst: int = 3, max_chats: int = 10000, max_retries: int = 3):
+        self.rate = rate
+        self.chat_limit = (chat_rate, chat_burst)
+        self.group_limit = (group_rate, group_burst)
+        self.max_retries = max_retries
+        idle_ttl = max(chat_burst / chat_rate, group_burst / group_rate)
+        self._chats = lrucache(max_chats, idle_ttl)  # chat_id -> (tokens, updated_at)
+        self._blocked_until = {}  # chat_id -> момент окончания блокировки после 429
+
+        self._tokens = rate
+        self._updated_at = time.monotonic()
+        self._waiters = []  # куча (priority, seq, future)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def _limit(self, chat_id):
+        return self.group_limit if chat_id < 0 else self.chat_limit
+
+    def _reserve(self, chat_id, now):
+        """Забирает токен чата (допуская долг) и возвращает, сколько ждать отправки."""
+        rate, burst = self._limit(chat_id)
+        start = now
+        blocked_until = self._blocked_until.get(chat_id)
+        if blocked_until is not None:
+            if blocked_until > now:
+                start = blocked_until  # Токены отсчитываются с конца блокировки
+            else:
+                del self._blocked_until[chat_id]
+        tokens, updated_at = self._chats.get(chat_id, (burst, start))
+        tokens = min(burst, tokens + max(0.0, start - updated_at) * rate) - 1
+        self._chats.set(chat_id, (tokens, start))
+        return start - now + max(0.0, -tokens / rate)
+
+    def _penalize(self, chat_id, retry_after):
+        now = time.monotonic()
+        # Прошедшие блокировки других чатов удаляются здесь: 429 редки, а словарь не растёт
+        for expired in [key for key, until in self._blocked_until.items() if until <= now]:
+            del self._blocked_until[expired]
+        self._blocked_until[chat_id] = max(self._blocked_until.get(chat_id, now), now + retry_after)
+
+    async def _acquire(self, priority):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._wakeup.set()
+        await future
+
+    async def send(self, chat_id: int, request):
+        """Выполняет request() (корутину запроса к API), соблюдая лимиты чата и бота."""
+        priority = _priority.get()
+        for attempt in itertools.count():
+            delay = self._reserve(chat_id, time.monotonic())
+            if delay:
+                await asyncio.sleep(delay)
+            await self._acquire(priority)
+            try:
+                return await request()
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                logger.log("WARNING", "telegram_retry_after", chat_id=chat_id, retry_after=e.retry_after)
+                self._penalize(chat_id, e.retry_after)
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            if not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():  # Ожидавший запрос мог быть отменён
+                self._tokens -= 1
+                future.set_result(None)
+
+
+class SendQueueMiddleware(BaseRequestMiddleware):
+    """Пропускает адресованные чату запросы Bot API через sendqueue."""
+
+    def __init__(self, queue: sendqueue):
+        self.queue = queue
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if not isinstance(chat_id, int):
+            return await make_request(bot, method)  # answerCallbackQuery, getUpdates и т.п.
+        return await self.queue.send(chat_id, lambda: make_request(bot, method))
@@ -0,0 +1,88 @@
+"""Бенчмарк многопроцессного запуска бота.
+
+Поднимает shardrunner с разным числом воркеров, прогоняет через него одинаковый
+поток обновлений «Статистика» от множества пользователей и выводит пропускную
+способность. Запросы к Telegram подменяются заглушкой, запросы к БД выполняются
+по-настоящему (параметры подключения берутся из .env).
+
+Запуск: python shard_benchmark.py [--updates 2000] [--users 200] [--workers 1,2,4]
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime
+
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import EditMessageText, SendMessage
+from aiogram.types import Chat, Message
+
+from shardrunner import shardrunner
+
+
+class StubSession(BaseSession):
+    """Сессия Bot, которая отвечает на запросы к API без обращения к Telegram."""
+
+    async def make_request(self, bot, method, timeout=None):
+        if isinstance(method, (SendMessage, EditMessageText)):
+            return Message(
+                message_id=1,
+                date=datetime.now(),
+                chat=Chat(id=method.chat_id or 0, type="private"),
+                text=method.text
+            )
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def make_update(update_id, user_id, text):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "bench", "username": f"bench{user_id}"},
+            "text": text,
+        },
+    }
+
+
+async def measure(workers, updates, users, text):
+    runner = shardrunner(workers, session_factory=StubSession, quiet=True)
+    await runner.start()
+    started = time.perf_counter()
+    for i in range(updates):
+        await runner.dispatch(make_update(i + 1, 1_000_000 + i % users, text))
+    await runner.stop()  # Возвращается, когда воркеры обработали все обновления
+    return updates / (time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--text", default="Статистика")
+    args = parser.parse_args()
+
+    # Как в load_test.py, измеряем сам бот: ограничение частоты и очередь исходящих
+    # сообщений в воркерах выключены. Воркеры запускаются через spawn и читают
+    # настройки из окружения, поэтому они задаются здесь, до запуска воркеров
+    os.environ["THROTTLE_ENABLED"] = "false"
+    os.environ["SEND_QUEUE_ENABLED"] = "false"
+
+    baseline = None
+    for workers in map(int, args.workers.split(",")):
+        rate = await measure(workers, args.updates, args.users, args.text)
+        baseline = baseline or rate
+        print(f"воркеров: {workers:>2}  обновлений/с: {rate:8.0f}  ускорение: x{rate / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import sys
+from queue import Full
+
+from aiogram import Bot
+from aiohttp import web
+
+from bothandler import bothandler
+import config
+import webhook
+
+
+def route_key(update):
+    """Возвращает ключ маршрутизации обновления: ID пользователя, иначе ID чата."""
+    for name, event in update.items():
+        if not isinstance(event, dict):
+            continue
+        user = event.get("from") or event.get("user")
+        if user:
+            return user["id"]
+        chat = event.get("chat")
+        if chat:
+            return chat["id"]
+    return update.get("update_id", 0)
+
+
+def run_worker(index, queue, ready, session_factory=None, quiet=False):
+    """Точка входа процесса-воркера."""
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+    try:
+        asyncio.run(_serve(index, queue, ready, session_factory))
+    except KeyboardInterrupt:
+        pass  # Останавливает фронт, присылая None в очередь
+
+
+async def _serve(index, queue, ready, session_factory, max_in_flight=100):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C получает вся группа процессов
+    handler = bothandler()
+    handler.metrics_port += index
+    if session_factory:
+        handler.bot = Bot(token=handler.BOT_TOKEN, session=session_factory())
+    await handler.startup()
+    await handler.dp.emit_startup(bot=handler.bot)
+    ready.put(index)
+
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(max_in_flight)
+    tails = {}  # key -> последняя задача пользователя; следующая ждёт её завершения
+
+    async def process(prev, update):
+        try:
+            if prev:
+                await asyncio.wait([prev])
+            await handler.dp.feed_raw_update(handler.bot, update)
+        except Exception as e:
+            print(f"Ошибка обработки обновления в воркере {index}: {e}")
+        finally:
+            slots.release()
+
+    def forget(key, task):
+        if tails.get(key) is task:
+            del tails[key]
+
+    try:
+        while True:
+            await slots.acquire()
+            item = await loop.run_in_executor(None, queue.get)
+            if item is None:
+                break
+            key, payload = item
+            task = asyncio.create_task(process(tails.get(key), json.loads(payload)))
+            tails[key] = task
+            task.add_done_callback(lambda t, key=key: forget(key, t))
+
+        if tails:
+            await asyncio.wait(list(tails.values()))
+    finally:
+        await handler.dp.emit_shutdown(bot=handler.bot)
+        await handler.shutdown()
+        await handler.bot.session.close()
+
+
+class shardrunner:
+    """Запуск бота в нескольких процессах.
+
+    Фронт-процесс получает обновления (long polling или вебхук) и раскладывает
+    их по воркерам по ID пользователя, поэтому шаги FSM одного пользователя
+    обрабатываются одним воркером строго по порядку. У каждого воркера свой
+    event loop и свой пул соединений asyncpg.
+    """
+
+    def __init__(self, workers, queue_size=1000, session_factory=None, quiet=False):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.session_factory = session_factory  # Подмена сессии Bot в воркерах (для бенчмарка)
+        self.quiet = quiet  # Не выводить логи воркеров
+        self._context = multiprocessing.get_context("spawn")
+        self._queues = []
+        self._processes = []
+
+    async def start(self):
+        ready = self._context.Queue()
+        for index in range(self.workers):
+            queue = self._context.Queue(self.queue_size)
+            process = self._context.Process(
+                target=run_worker,
+                args=(index, queue, ready, self.session_factory, self.quiet),
+                name=f"voting-bot-worker-{index}",
+                daemon=True
+            )
+            process.start()
+            self._queues.append(queue)
+            self._processes.append(process)
+
+        loop = asyncio.get_running_loop()
+        for _ in range(self.workers):
+            await loop.run_in_executor(None, ready.get)
+        print(f"🟢 Запущено воркеров: {self.workers}")
+
+    async def dispatch(self, update):
+        """Отправляет обновление (dict в формате Bot API) воркеру его пользователя."""
+        key = route_key(update)
+        queue = self._queues[key % self.workers]
+        item = (key, json.dumps(update, separators=(",", ":")))
+        try:
+            queue.put_nowait(item)
+        except Full:
+            # Очередь воркера заполнена — ждём, не блокируя event loop фронта
+            await asyncio.get_running_loop().run_in_executor(None, queue.put, item)
+
+    async def stop(self):
+        """Дожидается, пока воркеры обработают очереди, и завершает их."""
+        loop = asyncio.get_running_loop()
+        for queue in self._queues:
+            await loop.run_in_executor(None, queue.put, None)
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join)
+
+    async def run(self):
+        async with Bot(token=config.сonfig.BOT_TOKEN) as bot:
+            allowed_updates = bothandler().dp.resolve_used_update_types()
+
+            await self.start()
+            try:
+                if config.сonfig.BOT_MODE == "webhook":
+                    await self._run_webhook(bot, allowed_updates)
+                else:
+                    await self._run_polling(bot, allowed_updates)
+            finally:
+                await self.stop()
+
+    async def _run_polling(self, bot, allowed_updates):
+        async def poll():
+            offset = None
+            delay = 1
+            while True:
+                try:
+                    updates = await bot.get_updates(offset=offset, timeout=30, allowed_updates=allowed_updates)
+                except Exception as e:
+                    print(f"Ошибка получения обновлений: {e}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 30)
+                    continue
+                delay = 1
+                for update in updates:
+                    offset = update.update_id + 1
+                    await self.dispatch(update.model_dump(mode="json", exclude_none=True, by_alias=True))
+
+        await bot.delete_webhook()
+        task = asyncio.create_task(poll())
+        try:
+            await webhook.wait_for_stop_signal()
+        finally:
+            task.cancel()
+
+    async def _run_webhook(self, bot, allowed_updates):
+        async def handle(request):
+            if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != config.сonfig.WEBHOOK_SECRET:
+                return web.Response(status=401)
+            await self.dispatch(await request.json())
+            return web.Response()
+
+        await webhook.serve(bot, lambda app: app.router.add_post(config.сonfig.WEBHOOK_PATH, handle), allowed_updates)
@@ -0,0 +1,85 @@
+import time
+
+from aiogram import BaseMiddleware, types
+
+from cache import lrucache
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Ограничение частоты запросов пользователя по алгоритму token bucket.
+
+    У каждого пользователя есть общий бакет на все обработчики и отдельные
+    бакеты для обработчиков из limits (тяжёлые запросы получают более строгий
+    лимит). Токен забирается, только если он есть во всех бакетах запроса.
+
+    Middleware регистрируется на обновления раньше FSM: запрос сверх лимита не
+    доходит ни до обработчика, ни до загрузки FSM-состояния и сохранения
+    пользователя в БД. Пользователь получает заранее подготовленный ответ, не
+    чаще раза в warn_interval секунд. Обработчик для лимитов из limits
+    определяется по фильтрам обработчиков router без FSM-состояния, поэтому
+    такие лимиты действуют для кнопок, команд и inline-кнопок.
+    Бакеты хранятся в ограниченном LRU-кэше и удаляются после простоя, за
+    который успели бы наполниться полностью.
+    """
+
+    EVENT_TYPES = ("message", "callback_query")
+
+    SLOW_DOWN = "⏳ Слишком много запросов. Подождите немного и попробуйте снова."
+
+    def __init__(self, rate: float, burst: int, limits=None, max_users: int = 10000, warn_interval: float = 5, router=None):
+        self.rate = rate
+        self.burst = burst
+        self.limits = limits or {}  # имя обработчика -> (rate, burst)
+        self.router = router  # Router (Dispatcher), по обработчикам которого определяются limits
+        idle_ttl = max(b / r for r, b in [(rate, burst), *self.limits.values()])
+        self._buckets = lrucache(max_users * (1 + len(self.limits)), idle_ttl)  # key -> (tokens, updated_at)
+        self._warned = lrucache(max_users, warn_interval)
+        self._next_sweep = 0
+
+    def _tokens(self, key, rate, burst, now):
+        tokens, updated_at = self._buckets.get(key, (burst, now))
+        return min(burst, tokens + (now - updated_at) * rate)
+
+    def allow(self, user_id, handler_name):
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._buckets.evict_expired()
+            self._warned.evict_expired()
+            self._next_sweep = now + 60
+
+        buckets = [(user_id, self.rate, self.burst)]
+        limit = self.limits.get(handler_name)
+        if limit:
+            buckets.append(((user_id, handler_name), *limit))
+
+        tokens = [self._tokens(key, rate, burst, now) for key, rate, burst in buckets]
+        if min(tokens) < 1:
+            return False  # Отказ не тратит токены ни одного бакета
+        for (key, _, _), left in zip(buckets, tokens):
+            self._buckets.set(key, (left - 1, now))
+        return True
+
+    async def _handler_name(self, event_type, event, data):
+        """Имя обработчика, который router выберет для события без учёта FSM-состояния."""
+        if not self.limits or self.router is None:
+            return None
+        for handler in self.router.observers[event_type].handlers:
+            matched, _ = await handler.check(event, **data)
+            if matched:
+                return handler.callback.__name__
+        return None
+
+    async def __call__(self, handler, event, data):
+        user = data.get('event_from_user')
+        if user is None or event.event_type not in self.EVENT_TYPES:
+            return await handler(event, data)
+
+        message = event.event
+        if self.allow(user.id, await self._handler_name(event.event_type, message, data)):
+            return await handler(event, data)
+
+        if isinstance(message, types.CallbackQuery):
+            await message.answer(self.SLOW_DOWN)
+        elif user.id not in self._warned:
+            self._warned.set(user.id, True)
+            await message.answer(self.SLOW_DOWN)
@@ -0,0 +1,93 @@
+import asyncio
+
+import asyncpg
+
+
+class votebuffer:
+    """Буфер отложенной записи голосов.
+
+    Голоса копятся в очереди процесса и сбрасываются в БД пачками — по таймеру
+    или при наполнении пачки. Каждый submit() завершается только после того,
+    как пачка с этим голосом записана, и возвращает исход голосования. Пачка,
+    откатившаяся из-за взаимоблокировки, записывается повторно.
+    """
+
+    def __init__(self, flush_func, flush_interval: float = 0.05, max_batch: int = 500, max_retries: int = 3):
+        self.flush_func = flush_func  # async (list of votes) -> list of outcomes
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+
+        self._pending = []  # [(vote, future)]
+        self._has_items = asyncio.Event()
+        self._full = asyncio.Event()
+        self._closing = False
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, vote):
+        if self._closing:
+            raise RuntimeError("Буфер голосов закрыт")
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((vote, future))
+        self._has_items.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        return await future
+
+    async def close(self):
+        """Сбрасывает оставшиеся голоса и останавливает фоновую задачу."""
+        self._closing = True
+        self._has_items.set()
+        self._full.set()
+        if self._task:
+            await self._task
+
+    async def _run(self):
+        while True:
+            await self._has_items.wait()
+            if not self._closing:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+            await self._flush()
+            if self._closing and not self._pending:
+                return
+
+    async def _flush(self):
+        batch = self._pending[:self.max_batch]
+        self._pending = self._pending[self.max_batch:]
+        if not self._pending:
+            self._has_items.clear()
+        if len(self._pending) < self.max_batch and not self._closing:
+            self._full.clear()
+        if not batch:
+            return
+
+        try:
+            outcomes = await self._write([vote for vote, _ in batch])
+        except Exception as e:
+            print(f"Ошибка при записи пачки голосов: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), outcome in zip(batch, outcomes):
+            if not future.done():
+                future.set_result(outcome)
+
+    async def _write(self, votes):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self.flush_func(votes)
+            except asyncpg.DeadlockDetectedError:
+                # Запрос пачки откатился целиком, поэтому повтор безопасен
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(0.01 * 2 ** attempt)
@@ -0,0 +1,50 @@
+import asyncio
+import signal
+import sys
+
+from aiohttp import web
+
+import config
+
+
+async def wait_for_stop_signal():
+    """Ждёт SIGINT или SIGTERM."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass  # Windows: остановка по KeyboardInterrupt
+    await stop.wait()
+
+
+async def serve(bot, register, allowed_updates):
+    """Принимает обновления через вебхук на встроенном aiohttp-сервере до сигнала остановки.
+
+    register(app) добавляет в приложение обработчик WEBHOOK_PATH; запросы
+    без верного X-Telegram-Bot-Api-Secret-Token он должен отклонять.
+    """
+    if not config.сonfig.WEBHOOK_SECRET:
+        print("❌ WEBHOOK_SECRET не задан! Без него вебхук не проверяет отправителя запросов")
+        sys.exit(1)
+
+    app = web.Application()
+    register(app)
+
+    if config.сonfig.WEBHOOK_URL:
+        await bot.set_webhook(
+            config.сonfig.WEBHOOK_URL.rstrip("/") + config.сonfig.WEBHOOK_PATH,
+            secret_token=config.сonfig.WEBHOOK_SECRET,
+            allowed_updates=allowed_updates
+        )
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, config.сonfig.WEBHOOK_HOST, config.сonfig.WEBHOOK_PORT)
+    await site.start()
+    print(f"🌐 Вебхук слушает {config.сonfig.WEBHOOK_HOST}:{config.сonfig.WEBHOOK_PORT}{config.сonfig.WEBHOOK_PATH}")
+    try:
+        await wait_for_stop_signal()
+    finally:
+        await runner.cleanup()